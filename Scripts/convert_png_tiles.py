@@ -23,45 +23,20 @@
 #
 # Overwrite SKFONT.CG with the output starting at the tile offset to replace.
 
-import struct
 import sys
 
 import numpy as np
 from PIL import Image
 
+from utils import skfont
+
 
 def convert_font(input_file):
     with Image.open(input_file) as input_file:
-        output = b""
-
-        # Read image and split into equal number of 26 x 26 arrays.
-        image = list(input_file.getdata(0))
-        image_size = input_file.size
-        image_2d = np.empty((image_size[1], image_size[0]), dtype="uint8")
-
+        # Read the first channel of the image as 8-bit pixel data.
         try:
-            for i in range(0, 26):
-                image_2d[i] = image[i * image_size[0] : (i + 1) * image_size[0]]
-
-            # Split into individual tiles.
-            tiles = np.hsplit(image_2d, image_size[0] / 26)
-            for i in tiles:
-                # Bitwise shift 4 to the right to obtain 0-F value for each pixel.
-                tile = np.right_shift(i, 4)
-
-                # Divide each tile into 26 x 2 arrays.
-                tile_row_pairs = np.vsplit(tile, 13)
-
-                for row_pair in tile_row_pairs:
-                    for column in range(0, 26):
-                        # Upper pixel is right nybble; lower pixel is left nybble.
-                        upper_pixel = row_pair[0][column]
-                        lower_pixel = row_pair[1][column] << 4
-                        pixels = upper_pixel + lower_pixel
-
-                        output += struct.pack("=B", pixels)
-
-        except ValueError:
+            output = skfont.encode_tiles(np.asarray(input_file.getchannel(0)))
+        except skfont.SKFONTError:
             print(
                 "Input PNG file must be 8-bit, no transparency, and have a height of 26 pixels and width a multiple of 26 pixels."
             )
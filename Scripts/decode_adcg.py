@@ -1,133 +1,88 @@
 # This script takes a file containing ADCG chunks and decompresses them.
-# Pillow is required as a dependency.
+# NumPy and Pillow are required as dependencies.
 #
 # The decompressed ADCG chunks are output in the working directory with the extension .adcg.
 # The decompressed image data is then weaved into a complete image and saved as PNG.
 # In files that contain them, ADCG headers are preceded by an AGR1 or AGR2 signature,
 # which is followed by 00 00 00 00.
 # Some values in the ADCG header are currently unknown.
+# Subtextures are decoded in memory and composed into the image with NumPy, without temporary files.
+#
+# With -j N, chunks are decompressed and woven by N worker processes.
+#
+# The locations of the chunks in the input file are saved next to it with the extension .chunks.json,
+# and reused on later runs while the input file is unchanged.
 
-import io
+import argparse
 import mmap
 import os
 import struct
-import subprocess
 import sys
-from collections import namedtuple
-
-from PIL import Image
+from concurrent.futures import ProcessPoolExecutor
 
-from utils import prs
+from utils import adcg, chunks, pool, prs, pvr
 
 path = os.path.realpath(os.path.dirname(sys.argv[0]))
 
-# Set these to the path and arguments of a utility that accepts a PVR file and output a PNG file.
-# It is recommended that the arguments include a switch that suppresses console output, if available.
-pvr2png_path = os.path.join(path, os.path.normpath(r".\lib\pvr2png.exe"))
-pvr2png_args = ["-q"]
-
-
-def weave_adcg(input_data, address):
-    """Extracts the PVR subtextures from an uncompressed ADCG chunk,
-    and attempts to assemble it into a full image based on the properties
-    in the ADCG header."""
-
-    ADCGSubTexture = namedtuple("ADCGSubTexture", "id offset x y value1")
 
-    with io.BytesIO(input_data) as stream:
-        _signature = stream.read(4)
-        adcg_size = struct.unpack("<I", stream.read(4))[0]
-        _value1 = stream.read(
-            4
-        )  # 00 00 00, followed by a single byte. Possible signed 2-byte value?
-        textures_num = struct.unpack("<I", stream.read(4))[0]
+def decode_adcg_chunk(
+    input_file: str, adcg_index: int, adcg_pos: int, adcg_prs_data: bytes
+) -> tuple[bool, list]:
+    """Decompress the ADCG chunk in adcg_prs_data, save the uncompressed
+    data, and weave it into a PNG file. This function is run in a worker
+    process by extract_adcg when jobs is greater than 1.
 
-        texture_width = struct.unpack("<H", stream.read(2))[0]
-        texture_height = struct.unpack("<H", stream.read(2))[0]
-        _value2 = stream.read(4)  # 18 00 00 00. Offset - 8?
+    Returns a tuple containing whether the PNG file was written and a list
+    of messages to print."""
 
-        pvr_format = stream.read(4)[0:2]
+    abs_offset = hex(adcg_pos)
+    messages = []
 
-        total_width = struct.unpack("<H", stream.read(2))[0]
-        total_height = struct.unpack("<H", stream.read(2))[0]
-
-        # Initialize output image.
-        output_image = Image.new("RGBA", (total_width, total_height))
-
-        textures = []
-
-        for _ in range(textures_num):
-            textures.append(
-                ADCGSubTexture(
-                    struct.unpack("<I", stream.read(4))[0],
-                    struct.unpack("<I", stream.read(4))[0],
-                    struct.unpack("<H", stream.read(2))[0],
-                    struct.unpack("<H", stream.read(2))[0],
-                    stream.read(4),
-                )
-            )
+    try:
+        # uncompressed_size = struct.unpack("<I",adcg_prs_data[8:12])[0]
+        adcg_uncompressed = prs.decompress(adcg_prs_data)
+    except Exception as e:
+        messages.append(str(e))
+        messages.append(
+            f"Error processing ADCG chunk at {abs_offset}. Continuing with next chunk."
+        )
+        return (False, messages)
 
-        # Create PVR textures.
-        for i, data in enumerate(textures):
-            stream.seek(data.offset + 32 + (16 * i))
-
-            try:
-                # Texture size is calculated from offset of next texture, plus 16.
-                texture_size = textures[i + 1].offset - data.offset + 16
-                texture_data = stream.read(texture_size)
-            except IndexError:
-                # For last texture, read to end of file.
-                texture_data = stream.read(adcg_size - data.offset + 16)
-
-            chunk_size = struct.pack("<I", len(texture_data) + 8)
-
-            output = (
-                b"PVRT"
-                + chunk_size
-                + pvr_format
-                + b"\x00\x00"
-                + struct.pack("<H", texture_width)
-                + struct.pack("<H", texture_height)
-                + texture_data
-            )
+    # Save uncompressed ADCG data and PNG to file.
+    filename = input_file + "_" + str(adcg_index).zfill(4) + "_" + abs_offset
 
-            with open("~temp.pvr", "wb") as output_file:
-                output_file.write(output)
+    with open(filename + ".adcg", "wb") as raw_file:
+        raw_file.write(adcg_uncompressed)
 
-            # Convert PVR texture to PNG.
-            pvr_convert = subprocess.run(
-                [pvr2png_path, "~temp.pvr", "~temp.png"] + pvr2png_args, shell=True
-            )
-            pvr_convert.check_returncode()
+    errors = []
+    try:
+        pixels = adcg.weave(adcg_uncompressed, errors=errors)
+    except (adcg.ADCGError, struct.error) as e:
+        messages.append(f"Error processing ADCG chunk at {abs_offset}: {e}")
+        return (False, messages)
 
-            # Load converted texture into an Image object.
-            if os.path.isfile("~temp.png"):
-                with Image.open("~temp.png") as png:
-                    output_image.paste(png, (data.x, data.y))
-            else:
-                print(
-                    f"Error processing subtexture in ADCG chunk at {address}. Check output."
-                )
-                continue
+    for e in errors:
+        messages.append(f"Error processing subtexture in ADCG chunk at {abs_offset}: {e}")
 
-        if os.path.isfile("~temp.pvr"):
-            os.remove("~temp.pvr")
-        if os.path.isfile("~temp.png"):
-            os.remove("~temp.png")
+    output_image = pvr.to_image(pixels)
+    with open(filename + ".png", "wb") as output_file:
+        output_image.save(output_file)
+        messages.append(f"{output_file.name}: Dimensions: {output_image.size}.")
 
-        return output_image
+    return (True, messages)
 
 
-def extract_adcg(input_file, offset=0, end=-1):
+def extract_adcg(input_file, offset=0, end=-1, jobs=1):
     """From input_file, searches for ADCG chunks and decompresses them.
     The original uncompressed ADCG data is saved to file, as its header is
     required to reconstruct the file after editing the image.
     Each chunk is then assembled into a complete image file and saved as PNG.
 
     If the offset argument is set, start searching that many bytes into the file.
-    If the end argument is set, stop searching after this many bytes."""
+    If the end argument is set, stop searching after this many bytes.
+    If jobs is greater than 1, chunks are processed in that many worker
+    processes, and messages are printed as each chunk is completed."""
 
-    adcg_index = 0
     files_written = 0
 
     with open(input_file, "rb") as f:
@@ -135,93 +90,79 @@ def extract_adcg(input_file, offset=0, end=-1):
             if end < 0:
                 end = len(mm)
 
-            while True:
-                # Decompress a single ADCG chunk.
-                adcg_pos = mm.find(b"ADCG", mm.tell())
-
-                if adcg_pos > end:
-                    return files_written
-
-                if adcg_pos != -1:
-                    mm.seek(adcg_pos)
-
-                    # Skip offset bytes, but attempt to keep index number accurate.
-                    if mm.tell() >= offset:
-                        abs_offset = hex(mm.tell())
-                        adcg_prs_data = bytearray()
-
-                        while True:
-                            buffer = mm.read(4)
-                            adcg_prs_data += buffer
-                            if buffer == b"EOFC":
-                                adcg_prs_data += mm.read(4)
-                                break
-
-                        try:
-                            # uncompressed_size = struct.unpack("<I",adcg_prs_data[8:12])[0]
-                            adcg_uncompressed = prs.decompress(bytes(adcg_prs_data))
-                        except Exception as e:
-                            print(e)
-                            print(
-                                f"Error processing ADCG chunk at {abs_offset}. Continuing with next chunk."
-                            )
-                            continue
-
-                        # Save uncompressed ADCG data and PNG to file.
-                        filename = (
-                            input_file
-                            + "_"
-                            + str(adcg_index).zfill(4)
-                            + "_"
-                            + abs_offset
-                        )
-
-                        with open(filename + ".adcg", "wb") as raw_file:
-                            raw_file.write(adcg_uncompressed)
-
-                        output_image = weave_adcg(adcg_uncompressed, abs_offset)
-
-                        with open(filename + ".png", "wb") as output_file:
-                            output_image.save(output_file)
-                            files_written += 1
-                            print(
-                                f"{output_file.name}: Dimensions: {output_image.size}."
-                            )
-
-                    else:
-                        print(
-                            f"Skipping ADCG chunk {str(adcg_index).zfill(4)} at {hex(mm.tell())}."
-                        )
-                        mm.seek(4, 1)
-
-                    adcg_index += 1
-
-                else:
-                    return files_written
+            # ADCG chunks before offset are still counted to keep the index
+            # number accurate. The index is read from the sidecar file if the
+            # input file was scanned before.
+            adcg_chunks = []
+            for adcg_index, adcg_chunk in enumerate(
+                chunks.filter_chunks(chunks.load_index(input_file), b"ADCG")
+            ):
+                if adcg_chunk.offset > end:
+                    break
+                if adcg_chunk.offset < offset:
+                    print(
+                        f"Skipping ADCG chunk {str(adcg_index).zfill(4)} at {hex(adcg_chunk.offset)}."
+                    )
+                    continue
+                adcg_chunks.append((adcg_index, adcg_chunk))
+
+            tasks = (
+                (
+                    input_file,
+                    adcg_index,
+                    adcg_chunk.offset,
+                    mm[adcg_chunk.offset : adcg_chunk.offset + adcg_chunk.compressed_length],
+                )
+                for adcg_index, adcg_chunk in adcg_chunks
+            )
+
+            if jobs > 1:
+                with ProcessPoolExecutor(max_workers=jobs) as executor:
+                    # Keep at most 2 chunks per worker in the queue.
+                    results = pool.imap_unordered(executor, decode_adcg_chunk, tasks, jobs * 2)
+                    for written, messages in results:
+                        for message in messages:
+                            print(message)
+                        files_written += written
+            else:
+                for i in tasks:
+                    written, messages = decode_adcg_chunk(*i)
+                    for message in messages:
+                        print(message)
+                    files_written += written
+
+    return files_written
 
 
 def main():
-    if len(sys.argv) > 2:
-        if len(sys.argv) >= 4:
-            files_written = extract_adcg(
-                sys.argv[1],
-                int(sys.argv[2], (16 if sys.argv[2].startswith("0x") else 10)),
-                int(sys.argv[3]),
-            )
-        elif len(sys.argv) == 3:
-            files_written = extract_adcg(
-                sys.argv[1],
-                int(sys.argv[2], (16 if sys.argv[2].startswith("0x") else 10)),
-            )
-        else:
-            files_written = extract_adcg(sys.argv[1])
-    elif len(sys.argv) == 2:
-        files_written = extract_adcg(sys.argv[1])
-    else:
-        print(
-            "Specify input file containing ADCG data.\nOptional arguments: number of bytes to skip; number of bytes to search. Hex offsets starting with 0x allowed."
-        )
-        return
+    parser = argparse.ArgumentParser(
+        description="Decompress ADCG chunks and weave them into PNG files."
+    )
+    parser.add_argument("input_file", help="Input file containing ADCG data.")
+    parser.add_argument(
+        "offset",
+        nargs="?",
+        default="0",
+        help="Number of bytes to skip. Hex offsets starting with 0x allowed.",
+    )
+    parser.add_argument(
+        "end", nargs="?", type=int, default=-1, help="Number of bytes to search."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used for ADCG chunks.",
+    )
+    args = parser.parse_args()
+
+    files_written = extract_adcg(
+        args.input_file,
+        int(args.offset, (16 if args.offset.startswith("0x") else 10)),
+        args.end,
+        args.jobs,
+    )
 
     print(f"\nWrote {files_written} ADCG + PNG file pairs.")
 
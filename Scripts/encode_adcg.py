@@ -2,84 +2,312 @@
 # as generated by decode_adcg.py, and reconstructs the ADCG file with the edited
 # PNG file.
 #
-# To create the PVR textures from the PNG file, an external tool is required.
-# The default arguments below are for DOSPVR, which is not included.
+# The PVR textures are encoded from the PNG file in the texture format and at the coordinates
+# given in the ADCG header.
+# NumPy and Pillow are required as dependencies.
 #
 # The output file with the extension .out is to be pasted into the address
 # of the original ADCG data, overwriting the original compressed chunk.
 # Overwrite any leftover compressed data from the original ADCG chunk with byte 00.
 # The original ADCG archive should have the same file size after replacing data.
+#
+# Batch mode: with -a ARCHIVE, all ADCG and PNG file pairs extracted from ARCHIVE by decode_adcg.py
+# are found, and those whose PNG file was edited are encoded and compressed in parallel.
+# Each compressed chunk is compared with the space of the original chunk in the archive, as listed
+# in its chunk index (.chunks.json) when the archive is first seen and saved with the extension
+# .slots.json, and a report of the headroom of each chunk is printed.
+# With -p, chunks that fit are written into the archive directly, and the remaining space is
+# filled with byte 00. Chunks that do not fit are left unchanged. No .out files are written in
+# batch mode.
 
+import argparse
+import hashlib
+import json
+import mmap
 import os
+import re
 import struct
-import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from glob import escape as glob_escape
+from glob import glob
+import numpy as np
 from PIL import Image
-from utils import prs
+from utils import adcg, chunks, prs, pvr
 
 path = os.path.realpath(os.path.dirname(sys.argv[0]))
 
-# Set these to the path and arguments of a utility that accepts a PNG file and outputs a PVR file.
-# It is recommended that the arguments include a switch that suppresses console output, if available.
-png2pvr_path = os.path.join(path,os.path.normpath(r".\lib\dospvr.exe"))
-# These arguments are valid only for a texture with ARGB4444 pixel format and square twiddled data format.
-png2pvr_args = [png2pvr_path,"-q","-tw","-cf","4444","~temp.png","-of","~temp.pvr"]
+# Filenames written by decode_adcg.py: archive name, chunk index, chunk offset.
+ADCG_FILENAME = re.compile(r"_\d{4}_(0x[0-9a-f]+)\.adcg$")
+
+
+def encode_tiles(header, adcg_data, pixels):
+    """Crop the subtextures described by the ADCG header from an RGBA array
+    and encode them in the texture format of the header.
+    Areas of a subtexture outside the image are transparent.
+
+    Identical subtextures are encoded once, and the encoded data is reused.
+    Each subtexture is padded with the remaining original data to the
+    length of the original subtexture, so that the offsets in the header
+    remain valid.
+
+    Returns a tuple containing a bytearray of the texture data of all
+    subtextures, and the number of unique subtextures that were encoded.
+    Raises PVRError if a subtexture cannot be encoded or does not fit."""
 
-def encode_adcg(input_adcg,input_png,texture_size=64):
+    texture_width = header.texture_width
+    texture_height = header.texture_height
+    # Pad the image so that subtextures at the edges can be sliced.
+    bottom = max((i.y for i in header.subtextures), default=0) + texture_height
+    right = max((i.x for i in header.subtextures), default=0) + texture_width
+    padded = np.zeros(
+        (max(pixels.shape[0], bottom), max(pixels.shape[1], right), 4), dtype=np.uint8
+    )
+    padded[: pixels.shape[0], : pixels.shape[1]] = pixels
 
     texture_data = bytearray()
+    encoded_tiles = {}
+    for i, subtexture in enumerate(header.subtextures):
+        tile = padded[
+            subtexture.y : subtexture.y + texture_height,
+            subtexture.x : subtexture.x + texture_width,
+        ]
+        tile_hash = hashlib.sha1(np.ascontiguousarray(tile)).digest()
+        if (data := encoded_tiles.get(tile_hash)) is None:
+            data = pvr.encode_texture(tile, header.pixel_format, header.data_format)
+            encoded_tiles[tile_hash] = data
 
-    # Split input image into tiles according to ADCG header properties.
-    with open(input_adcg,"rb") as adcg:
-        adcg_header = adcg.read(32)
+        start, end = header.texture_range(i)
+        original = adcg_data[start:end]
+        if len(data) > len(original):
+            raise pvr.PVRError(
+                f"Size of subtexture {i} ({len(data)}) exceeds original subtexture ({len(original)})"
+            )
+        texture_data += data + original[len(data) :]
 
-        if adcg_header[0:4] != b'ADCG':
-            print(f"{adcg.name}: Not an ADCG file.")
-            return
+    return (texture_data, len(encoded_tiles))
 
-        textures_num = struct.unpack("<I",adcg_header[12:16])[0]
-        adcg_header += adcg.read(textures_num * 16)
-        # TODO: Read texture format from header and form png2pvr_args.
 
-    # Get crop coordinates.
-    crop_boxes = []
+def compress_adcg(input_adcg, input_png) -> tuple[bytes, list]:
+    """Encode input_png into the ADCG chunk input_adcg and compress it.
+    Nothing is printed or written, so that this function can be run in a
+    worker process.
 
-    for i in range(textures_num):
-        subtexture_header = adcg_header[32:][i*16:(i+1)*16]
-        box_x = struct.unpack("<H",subtexture_header[8:10])[0]
-        box_y = struct.unpack("<H",subtexture_header[10:12])[0]
-        crop_boxes.append((box_x, box_y, box_x + texture_size, box_y + texture_size))
+    Returns a tuple containing the compressed chunk, or None if it could
+    not be encoded, and a list of messages to print."""
+
+    messages = []
+
+    # Read texture format and subtexture coordinates from ADCG header.
+    with open(input_adcg,"rb") as f:
+        adcg_data = f.read()
+
+    try:
+        header = adcg.read_adcg(adcg_data)
+    except (adcg.ADCGError, struct.error):
+        messages.append(f"{input_adcg}: Not an ADCG file.")
+        return (None, messages)
 
-    # Create temporary PVR texture and add texture data to bytearray.
     with Image.open(input_png) as im:
-        for i in crop_boxes:
-            im.crop(i).save("~temp.png")
+        if im.size != (header.total_width, header.total_height):
+            messages.append(f"{input_png}: Warning: Image dimensions {im.size} do not match ADCG dimensions {(header.total_width, header.total_height)}.")
+        pixels = pvr.from_image(im)
+
+    try:
+        texture_data, unique_tiles = encode_tiles(header, adcg_data, pixels)
+    except pvr.PVRError as e:
+        messages.append(f"{input_adcg}: {e}")
+        return (None, messages)
+
+    tiles_num = len(header.subtextures)
+    if tiles_num:
+        messages.append(f"{input_png}: Encoded {unique_tiles} unique tiles out of {tiles_num} ({1 - unique_tiles / tiles_num:.0%} duplicates).")
 
-            subprocess.run(png2pvr_args,shell=True)
+    return (bytes(prs.compress(header.header + texture_data)), messages)
 
-            with open("~temp.pvr","rb") as pvr:
-                pvr.seek(16)
-                texture_data += pvr.read()
 
-            # DOSPVR does not overwrite the output file by default, so it must be deleted after each run.
-            os.remove("~temp.pvr")
+def encode_adcg(input_adcg,input_png):
+    """Encode input_png into the ADCG chunk input_adcg and compress it.
+    The compressed chunk is written to input_png + ".adcg.out".
 
-    output_data = bytes(prs.compress(adcg_header + texture_data))
+    Returns the compressed chunk, or None if it could not be encoded."""
+
+    output_data, messages = compress_adcg(input_adcg, input_png)
+    for message in messages:
+        print(message)
+    if output_data is None:
+        return None
 
     with open(input_png + ".adcg.out","wb") as output_file:
         output_file.write(output_data)
         print(f"{output_file.name}: Wrote {len(output_data)} bytes.")
 
+    return output_data
+
+
+def is_unchanged(input_adcg, input_png) -> bool:
+    """Return True if input_png is identical to the image woven from
+    input_adcg, as written by decode_adcg.py."""
+
+    try:
+        with open(input_adcg, "rb") as f:
+            pixels = adcg.weave(f.read())
+        with Image.open(input_png) as im:
+            return np.array_equal(pvr.from_image(im), pixels)
+    except (adcg.ADCGError, struct.error):
+        return False
+
+
+def encode_batch_chunk(input_adcg, input_png, skip_unchanged=True) -> tuple[str, bytes, list]:
+    """Encode one ADCG chunk for encode_batch. This function is run in a
+    worker process, and no files are written.
+
+    Returns a tuple containing the status ("encoded", "unchanged", or
+    "error"), the compressed chunk, and a list of messages to print."""
+
+    if skip_unchanged and is_unchanged(input_adcg, input_png):
+        return ("unchanged", None, [])
+
+    output_data, messages = compress_adcg(input_adcg, input_png)
+
+    return ("error" if output_data is None else "encoded", output_data, messages)
+
+
+def find_adcg_files(archive) -> list[tuple[int, str, str]]:
+    """Find the ADCG and PNG files written by decode_adcg.py for archive.
+
+    Returns a list of tuples containing the offset of the chunk in the
+    archive, the ADCG file, and the PNG file, sorted by offset."""
+
+    adcg_files = []
+    for adcg_file in glob(glob_escape(archive) + "_*.adcg"):
+        if (match := ADCG_FILENAME.search(adcg_file)) is None:
+            continue
+        if not os.path.isfile(input_png := os.path.splitext(adcg_file)[0] + ".png"):
+            continue
+        adcg_files.append((int(match.group(1), 16), adcg_file, input_png))
+
+    return sorted(adcg_files)
+
+
+def encode_batch(archive, jobs=1, patch=False, skip_unchanged=True, report_file=None) -> list[dict]:
+    """Encode and compress all edited ADCG chunks extracted from archive by
+    decode_adcg.py, and compare each one with the space of the original
+    compressed chunk, as listed in the chunk index of the archive.
+
+    If patch is True, chunks that fit are written into the archive and the
+    remaining space is filled with byte 00.
+
+    Returns a list of dicts, one per chunk, with the headroom of each chunk.
+    The list is also written as JSON to report_file if specified."""
+
+    # The space of each chunk is its original length, which includes the zero fill after chunks
+    # that were patched before.
+    slot_lengths = chunks.load_slots(
+        archive, chunks.filter_chunks(chunks.load_index(archive), b"ADCG")
+    )
+
+    tasks = []
+    for offset, input_adcg, input_png in find_adcg_files(archive):
+        if offset not in slot_lengths:
+            print(f"{input_adcg}: No ADCG chunk at {hex(offset)} in {archive}.")
+            continue
+        tasks.append((offset, input_adcg, input_png))
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            encode_batch_chunk,
+            [i[1] for i in tasks],
+            [i[2] for i in tasks],
+            [skip_unchanged] * len(tasks),
+        )
+        results = list(results)
+
+    report = []
+    patches = []
+    for (offset, input_adcg, _), (status, output_data, messages) in zip(tasks, results):
+        for message in messages:
+            print(message)
+        entry = {
+            "file": os.path.basename(input_adcg),
+            "offset": hex(offset),
+            "slot_length": slot_lengths[offset],
+            "length": None,
+            "headroom": None,
+            "status": status,
+        }
+        if output_data is not None:
+            entry["length"] = len(output_data)
+            entry["headroom"] = slot_lengths[offset] - len(output_data)
+            if entry["headroom"] < 0:
+                entry["status"] = "overflow"
+            else:
+                entry["status"] = "fits"
+                patches.append((offset, output_data))
+        report.append(entry)
+
+    if patch and patches:
+        with open(archive, "r+b") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as mm:
+                for offset, output_data in patches:
+                    mm[offset : offset + slot_lengths[offset]] = output_data + b"\x00" * (
+                        slot_lengths[offset] - len(output_data)
+                    )
+                mm.flush()
+        print(f"{archive}: Patched {len(patches)} ADCG chunks.")
+
+    print("\nOffset      Slot    Length  Headroom  Status     File")
+    for i in report:
+        print(
+            f"{i['offset']:<10} {i['slot_length']:>6}  {i['length'] if i['length'] is not None else '-':>8}  {i['headroom'] if i['headroom'] is not None else '-':>8}  {i['status']:<9}  {i['file']}"
+        )
+
+    if report_file:
+        with open(report_file, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=1)
+
+    return report
+
 
 def main():
-    if len(sys.argv) > 1:
-        for i in sys.argv[1:]:
+    parser = argparse.ArgumentParser(
+        description="Encode edited PNG files into ADCG chunks extracted by decode_adcg.py."
+    )
+    parser.add_argument("files", nargs="*", help="Input ADCG file(s).")
+    parser.add_argument(
+        "-a",
+        "--archive",
+        help="Batch mode: encode all edited ADCG chunks extracted from this archive.",
+    )
+    parser.add_argument(
+        "-p",
+        "--patch",
+        action="store_true",
+        help="In batch mode, write the chunks that fit into the archive.",
+    )
+    parser.add_argument(
+        "--all",
+        action="store_true",
+        help="In batch mode, also encode chunks whose PNG file is unchanged.",
+    )
+    parser.add_argument(
+        "-r", "--report", help="In batch mode, write the headroom report as JSON to this file."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Number of worker processes in batch mode."
+    )
+    args = parser.parse_args()
+
+    if args.archive:
+        encode_batch(args.archive, args.jobs, args.patch, not args.all, args.report)
+    elif args.files:
+        for i in args.files:
             if os.path.isfile(input_png := os.path.splitext(i)[0] + ".png"):
                 encode_adcg(i,input_png)
             else:
                 print(f"{i}: Matching PNG file not found.")
     else:
-        print("Specify input ADCG file(s).")
+        print("Specify input ADCG file(s), or an archive with -a.")
 
 
 if __name__ == "__main__":
@@ -1,204 +1,222 @@
 # This script reads a file containing BPV1 chunks and attempts to extract PVR textures.
+# Each texture is saved as a PVR file, which is required for repacking, and converted to PNG.
+# NumPy and Pillow are required as dependencies.
 # The PVR header is formed manually using information from https://github.com/nickworonekin/puyotools/wiki/PVR-Texture
 # Note that the output files may contain invalid PVR format information, and some fields are currently unknown.
-
-import io
+#
+# With -j N, subtextures are decoded and written by N worker processes, and messages are printed
+# as each subtexture is completed, so they may be out of order.
+#
+# The locations of the chunks in the input file are saved next to it with the extension .chunks.json,
+# and reused on later runs while the input file is unchanged.
+
+import argparse
 import mmap
 import os
 import struct
-import subprocess
 import sys
-from collections import namedtuple
-from utils import prs
+from concurrent.futures import ProcessPoolExecutor
+from utils import bpv1, chunks, pool, prs, pvr
 
 path = os.path.realpath(os.path.dirname(sys.argv[0]))
 
-BPV1Texture = namedtuple(
-    "BPV1Texture",
-    "offset, format, value1, value2, width, height, value3, value4, value5, value6, value7",
-)
-
-# Set these to the path and arguments of a utility that accepts a PVR file and outputs a PNG file.
-# It is recommended that the arguments include a switch that suppresses console output, if available.
-pvr2png_path = os.path.join(path, os.path.normpath(r".\lib\pvr2png.exe"))
-pvr2png_args = ["-q"]
 quiet = False
 
 
-def decompress_bpv1(bpv1_file):
+def decompress_bpv1(bpv1_file, jobs=1):
     """Open a file containing PRS-compressed BPV1 chunks. Each chunk is loaded
-    into a buffer and decompressed in place, then passed to extract_bpv1 with the
-    relative location added to the filename."""
+    into a buffer and decompressed in place, then its subtextures are written
+    with the relative location added to the filename."""
+
+    def decompressed_subtextures(mm):
+        for bpv1_chunk in chunks.filter_chunks(chunks.load_index(bpv1_file), b"BPV1"):
+            bpv1_pos = bpv1_chunk.offset
+            cprs_data = mm[bpv1_pos : bpv1_pos + bpv1_chunk.compressed_length]
+
+            bpv1_decompressed = prs.decompress(cprs_data)
+            # Skip invalid data.
+            if bpv1_decompressed is None:
+                continue
+
+            with open(f"{bpv1_file}_{hex(bpv1_pos)}.BP1U", "wb") as bpv1_decompressed_file:
+                bpv1_decompressed_file.write(bpv1_decompressed)
+                print(f"Wrote uncompressed file to {bpv1_decompressed_file.name}")
+
+            yield from read_subtextures(
+                bpv1_file, bpv1_decompressed, filename_offset=bpv1_pos
+            )
 
-    files_written = 0
     with open(bpv1_file, "rb") as f:
         with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-            while True:
-                # Search for BPV1 signature.
-                bpv1_pos = mm.find(b"BPV1", mm.tell())
-
-                if bpv1_pos != -1:
-                    mm.seek(bpv1_pos)
-                    buffer = b""
-                    cprs_data = bytearray()
-                    while buffer != b"CPRS":
-                        buffer = mm.read(4)
-                        cprs_data += buffer
-                    cprs_data += mm.read(4)
-
-                    bpv1_decompressed = prs.decompress(cprs_data)
-                    # Skip invalid data.
-                    if bpv1_decompressed is None:
-                        continue
-
-                    with open(f"{bpv1_file} + .BP1U") as bpv1_decompressed_file:
-                        bpv1_decompressed_file.write(bpv1_decompressed)
-                        print(f"Wrote uncompressed file to {bpv1_decompressed_file.name}")
-
-                    with io.BytesIO(bpv1_decompressed) as bpv1_stream:
-                        files_written += extract_bpv1(
-                            bpv1_file, bpv1_stream, filename_offset=bpv1_pos
-                        )
-
-                else:
-                    print(f"Extracted {files_written} textures.")
-                    break
-
-
-def search_bpv1(bpv1_file: str):
+            files_written = write_subtextures(decompressed_subtextures(mm), jobs)
+
+            print(f"Extracted {files_written} textures.")
+
+
+def search_bpv1(bpv1_file: str, jobs=1):
     """Open a file containing uncompressed BPV1 chunks."""
 
-    files_written = 0
     with open(bpv1_file, "rb") as f:
         with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
-            while True:
-                # Search for BPV1 signature.
-                bpv1_pos = mm.find(b"BPV1", mm.tell())
-
-                if bpv1_pos != -1:
-                    files_written += extract_bpv1(bpv1_file, mm, bpv1_pos)
+            subtextures = (
+                subtexture
+                for bpv1_pos, *_ in chunks.filter_chunks(chunks.load_index(bpv1_file), b"BPV1")
+                for subtexture in read_subtextures(bpv1_file, mm, bpv1_pos)
+            )
+            files_written = write_subtextures(subtextures, jobs)
 
-                else:
-                    print(f"Extracted {files_written} textures.")
-                    break
+            print(f"Extracted {files_written} textures.")
 
 
-def extract_bpv1(bpv1_file: str, mm: mmap, bpv1_pos=0, filename_offset=0):
+def extract_bpv1(bpv1_file: str, mm: mmap, bpv1_pos=0, filename_offset=0, jobs=1):
     """Extract BPV1 subtextures from bpv1_file opened at memory map mm, at bpv1_pos.
+    mm can also be a bytes object containing a decompressed chunk.
     filename_offset is added to the address in the filename and is specified by
     decompress_bpv1.
 
     Returns the number of subtextures written."""
 
-    global quiet
+    return write_subtextures(
+        read_subtextures(bpv1_file, mm, bpv1_pos, filename_offset), jobs
+    )
 
-    mm.seek(bpv1_pos)
-    mm.read(4)
-    bpv1_size = struct.unpack("<I", mm.read(4))[0]
-    _header_length = struct.unpack("<I", mm.read(4))[0]  # Appears to always be 0x8.
-    groups_num = struct.unpack("<I", mm.read(4))[
-        0
-    ]  # Number of data groups in this chunk.
-
-    groups = []
-    textures = []
-    for _ in range(groups_num):
-        # Group data: offset, unknown value 1, unknown value 2
-        groups.append(
-            (
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-            )
-        )
 
-    for _ in range(groups_num):
-        # Read 11 4-byte values as BPV1 texture properties. The last 5 values appear to always be 0.
-        textures.append(
-            BPV1Texture(
-                struct.unpack("<I", mm.read(4))[0],
-                mm.read(4)[2:],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
-                struct.unpack("<I", mm.read(4))[0],
+def read_subtextures(bpv1_file: str, data, bpv1_pos=0, filename_offset=0) -> list:
+    """Read the BPV1 chunk at bpv1_pos in data, which can be an mmap or bytes.
+
+    Returns a list of tuples containing the output filename without an
+    extension, the BPV1Texture, and the texture data of each subtexture."""
+
+    warnings = []
+    try:
+        table = bpv1.read_bpv1(data, bpv1_pos, warnings)
+    except bpv1.BPV1Error as e:
+        print(f"[Error] {bpv1_file}: {e}")
+        return []
+    for warning in warnings:
+        print(f"[Warning] {bpv1_file}: {warning}")
+
+    subtextures = []
+    for i, texture in enumerate(table.textures):
+        start, end = table.texture_range(i)
+        texture_data = data[bpv1_pos + start : bpv1_pos + end]
+
+        filename = f"_{hex(bpv1_pos + filename_offset)}_{str(i).zfill(3)}"
+        subtextures.append((bpv1_file + filename, texture, texture_data))
+
+    return subtextures
+
+
+def write_subtexture(
+    output_basename: str, data: bpv1.BPV1Texture, texture_data: bytes
+) -> list:
+    """Write a subtexture as a PVR file and convert it to a PNG file.
+
+    Returns a list of messages to print."""
+
+    output = (
+        b"PVRT"
+        + struct.pack(
+            "<IBBHHH",
+            len(texture_data) + 8,
+            data.pixel_format,
+            data.data_format,
+            0,
+            data.width,
+            data.height,
+        )
+        + texture_data
+    )
+
+    messages = []
+    with open(output_basename + ".pvr", "wb") as output_file:
+        output_file.write(output)
+        if not quiet:
+            messages.append(
+                f"{output_file.name}: Wrote {len(output)} bytes. PVR format: {hex(data.pixel_format)}, {hex(data.data_format)}. Dimensions: {data.width} x {data.height}."
             )
+
+    # Convert PVR texture to PNG.
+    try:
+        pixels = pvr.decode_texture(
+            texture_data, data.pixel_format, data.data_format, data.width, data.height
         )
+    except pvr.PVRError as e:
+        messages.append(f"[Error] {output_basename}.pvr: {e}")
+        return messages
+
+    pvr.to_image(pixels).save(output_basename + ".png")
+
+    return messages
+
+
+def write_subtextures(subtextures, jobs=1) -> int:
+    """Write each subtexture from an iterable of tuples returned by
+    read_subtextures. With jobs greater than 1, subtextures are written in
+    a process pool and messages are printed as each one completes.
+
+    Returns the number of subtextures written."""
 
-    # Create PVR textures.
     subtextures_written = 0
-    for i, data in enumerate(textures):
-        mm.seek(bpv1_pos + data.offset + 8)
-
-        try:
-            # Texture size is calculated from offset of next texture, minus current offset.
-            texture_size = textures[i + 1].offset - data.offset
-            texture_data = mm.read(texture_size)
-        except IndexError:
-            # For last texture, subtract from BPV1 chunk size instead.
-            texture_data = mm.read(bpv1_size - data.offset)
-
-        chunk_size = struct.pack("<I", len(texture_data) + 8)
-
-        filename = f"_{hex(bpv1_pos + filename_offset)}_{str(subtextures_written).zfill(3)}"
-
-        output = (
-            b"PVRT"
-            + chunk_size
-            + data.format
-            + b"\x00\x00"
-            + struct.pack("<H", data.width)
-            + struct.pack("<H", data.height)
-            + texture_data
-        )
 
-        with open(bpv1_file + filename + ".pvr", "wb") as output_file:
-            output_file.write(output)
-            if not quiet:
-                print(
-                    f"{output_file.name}: Wrote {len(output)} bytes. PVR format: {hex(data.format[0])}, {hex(data.format[1])}. Dimensions: {data.width} x {data.height}."
-                )
+    if jobs > 1:
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_set_quiet, initargs=(quiet,)
+        ) as executor:
+            # Keep at most 2 subtextures per worker in the queue, so compressed chunks are
+            # decompressed only as their subtextures are needed.
+            for messages in pool.imap_unordered(
+                executor, write_subtexture, subtextures, jobs * 2
+            ):
+                for message in messages:
+                    print(message)
+                subtextures_written += 1
+    else:
+        for i in subtextures:
+            for message in write_subtexture(*i):
+                print(message)
             subtextures_written += 1
 
-        # Convert PVR texture to PNG.
-        pvr_convert = subprocess.run(
-            [pvr2png_path, bpv1_file + filename + ".pvr", bpv1_file + filename + ".png"]
-            + pvr2png_args,
-            shell=True,
-        )
-        pvr_convert.check_returncode()
-
     return subtextures_written
 
 
-def main():
+def _set_quiet(value: bool):
     global quiet
+    quiet = value
 
-    if len(sys.argv) > 1:
-        if "-q" in sys.argv:
-            quiet = True
 
-        if "-c" in sys.argv:
-            for i in sys.argv[1:]:
-                if os.path.isfile(i):
-                    decompress_bpv1(i)
-        else:
-            for i in sys.argv[1:]:
-                if os.path.isfile(i):
-                    search_bpv1(i)
+def main():
+    global quiet
 
-    else:
-        print(
-            "Specify input file(s) containing BPV1 data.\n",
-            "Arguments:",
-            "-c: Input is PRS-compressed BPV1 data.",
-            "-q: Quiet mode -- do not print information on written files."
-        )
+    parser = argparse.ArgumentParser(
+        description="Extract PVR textures from files containing BPV1 data and convert them to PNG."
+    )
+    parser.add_argument("files", nargs="+", help="Input file(s) containing BPV1 data.")
+    parser.add_argument(
+        "-c", action="store_true", help="Input is PRS-compressed BPV1 data."
+    )
+    parser.add_argument(
+        "-q",
+        action="store_true",
+        help="Quiet mode -- do not print information on written files.",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes used to write subtextures.",
+    )
+    args = parser.parse_args()
+
+    quiet = args.q
+
+    for i in args.files:
+        if os.path.isfile(i):
+            if args.c:
+                decompress_bpv1(i, args.jobs)
+            else:
+                search_bpv1(i, args.jobs)
 
 
 if __name__ == "__main__":
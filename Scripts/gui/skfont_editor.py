@@ -1,18 +1,36 @@
 import os
+import shutil
 import sys
-import struct
+import tempfile
+from collections import OrderedDict
+from functools import cached_property
 
+import numpy as np
 import wx
 import wx.grid
 import wx.lib.agw.hyperlink as hl
 import wx.propgrid as wxpg
-from PIL import Image, ImageDraw, ImageOps
+from PIL import Image
+
+# The SKFONT tile codec is shared with the scripts in the parent directory.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import skfont  # noqa: E402
 
 
 class Utils:
+    @staticmethod
+    def scale_tiles(pixels: np.ndarray, scale: int) -> np.ndarray:
+        """Enlarge an array of tiles with the shape (count, size, size) by scale with
+        nearest neighbor resampling."""
+
+        if scale == 1:
+            return pixels
+
+        return pixels.repeat(scale, axis=1).repeat(scale, axis=2)
+
     @staticmethod
     def create_tile_bitmap(
-        tile_source: list,
+        tile_source: "list | FontTileSet",
         tile_range_start: int,
         tile_range_max: int,
         rows: int,
@@ -22,42 +40,50 @@ class Utils:
         add_gridlines=False,
         invert_image=False,
     ):
-        """Regenerate the bitmap for the tile grid from tile_source, a list of FontTile objects,
+        """Regenerate the bitmap for the tile grid from tile_source, a sequence of FontTile objects,
         starting from tile_range_start and not exceeding tile_range_max. Returns a wx.Bitmap.
         Call the Refresh() method on the window containing it afterward."""
 
-        # Rows and columns are transposed for x and y dimensions.
-        tile_grid = Image.new("RGB", (cols * size, rows * size))
-        if add_gridlines:
-            tile_grid_draw = ImageDraw.Draw(tile_grid)
+        scaled_size = size * scale
+        tile_limit = rows * cols
+        tile_range_end = min(tile_range_start + tile_limit, tile_range_max)
 
-        current_tile = 0
-        for y in range(0, rows):
-            for x in range(0, cols):
-                if tile_range_start + current_tile < tile_range_max:
-                    tile_image = tile_source[tile_range_start + current_tile].image
-                else:
-                    # If the tile range exceeds the file size, fill in with blank.
-                    tile_image = Image.new("RGB", (size, size), color=(128, 128, 128))
+        # Slice the visible tiles from the rendered sheet of tile_source at this scale.
+        if isinstance(tile_source, FontTileSet):
+            visible_tiles = tile_source.render(scale, tile_range_start, tile_range_end)
+        else:
+            visible_tiles = Utils.scale_tiles(
+                np.array(
+                    [i.pixels for i in tile_source[tile_range_start:tile_range_end]],
+                    dtype=np.uint8,
+                ).reshape(-1, size, size),
+                scale,
+            )
 
-                tile_grid.paste(tile_image, (x * size, y * size))
-                if add_gridlines and current_tile > 0:
-                    tile_grid_draw.line(
-                        [(x * size, 0), (x * size, size)], fill=(128, 128, 128)
-                    )
+        # If the tile range exceeds the file size, fill in with blank.
+        tile_grid = np.full((tile_limit, scaled_size, scaled_size), 128, dtype=np.uint8)
+        tile_grid[: len(visible_tiles)] = visible_tiles
 
-                current_tile += 1
+        # Arrange tiles in rows and columns.
+        tile_grid = (
+            tile_grid.reshape(rows, cols, scaled_size, scaled_size)
+            .transpose(0, 2, 1, 3)
+            .reshape(rows * scaled_size, cols * scaled_size)
+        )
 
-        if scale > 1:
-            tile_grid = tile_grid.resize(
-                (cols * size * scale, rows * size * scale),
-                resample=Image.Resampling.NEAREST,
-            )
+        if add_gridlines:
+            for x in range(1 if rows < 2 else 0, cols):
+                tile_grid[: scaled_size + scale, x * scaled_size : x * scaled_size + scale] = 128
 
         if invert_image:
-            tile_grid = ImageOps.invert(tile_grid)
+            tile_grid = 255 - tile_grid
 
-        tile_grid_output = wx.Image(tile_grid.size, tile_grid.tobytes())
+        # Convert monochrome pixel data to RGB. Rows and columns are transposed for x and y dimensions.
+        tile_grid_output = wx.Image(
+            cols * scaled_size,
+            rows * scaled_size,
+            np.stack((tile_grid, tile_grid, tile_grid), axis=2).tobytes(),
+        )
 
         return wx.Bitmap(tile_grid_output)
 
@@ -101,8 +127,7 @@ class MainFrame(wx.Frame):
 
         main_sizer = wx.BoxSizer(orient=wx.HORIZONTAL)
 
-        self.file_data = b""
-        self.tiles = []
+        self.tiles = None
         self.tile_rows = 10
         self.tile_cols = 10
         self.tile_scale = 1
@@ -135,20 +160,12 @@ class MainFrame(wx.Frame):
                 )
                 exit()
 
-            self.tiles = []
             self.tile_data_length = (self.tile_size**2) // 2
 
-            with open(self.filename, "rb") as skfont:
-                self.file_data = skfont.read()
-            for i in range(0, self.TILE_MAX):
-                tile = FontTile(
-                    self.file_data[
-                        i * self.tile_data_length : i * self.tile_data_length
-                        + self.tile_data_length
-                    ],
-                    self.tile_size,
-                )
-                self.tiles.append(tile)
+            # The font sheet is held only by the FontTileSet.
+            # FontTile objects are created when each tile is first viewed.
+            with open(self.filename, "rb") as file:
+                self.tiles = FontTileSet(file.read(), self.tile_size, self.TILE_MAX)
         else:
             exit()
 
@@ -275,25 +292,37 @@ class MainFrame(wx.Frame):
         self.Bind(wx.EVT_CLOSE, self.on_close)
 
     def save_skfont(self):
-        output_data = b""
-        for tile in self.tiles:
-            output_data += tile.data
+        """Write the tile data to a temporary file in the same directory, then replace
+        SKFONT.CG with it, so that an error while saving does not leave a truncated file."""
 
+        temp_filename = None
         try:
-            with open(self.filename, "wb") as file:
-                file.write(output_data)
+            with tempfile.NamedTemporaryFile(
+                "wb",
+                dir=os.path.dirname(os.path.abspath(self.filename)),
+                prefix=os.path.basename(self.filename) + ".",
+                suffix=".tmp",
+                delete=False,
+            ) as file:
+                temp_filename = file.name
+                file.write(self.tiles.data)
+            shutil.copymode(self.filename, temp_filename)
+            os.replace(temp_filename, self.filename)
+            temp_filename = None
             wx.MessageBox(
                 f"{self.filename} saved successfully.", "Save Complete", wx.OK
             )
             self.modified = False
         except Exception as e:
             wx.MessageBox(str(e), "Error", wx.OK | wx.ICON_ERROR)
+        finally:
+            if temp_filename is not None and os.path.exists(temp_filename):
+                os.remove(temp_filename)
 
     def on_replace_tiles(self, event):
         """Open a PNG image and convert it into FontTile objects. The FontTile(s) will
         overwrite the selected tile."""
 
-        image_tiles = []
         new_tiles = []
         image_filename = wx.FileSelector(
             "Open Image", wildcard="*.png", flags=wx.FD_OPEN | wx.FD_FILE_MUST_EXIST
@@ -328,33 +357,20 @@ class MainFrame(wx.Frame):
                     dlg.ShowModal()
                     return
 
-                # Divide input image into square tiles.
+                # Convert the red channel of the image into tile data, then into FontTiles.
+                image_data = skfont.encode_tiles(
+                    np.asarray(image.getchannel(0)), self.tile_size
+                )
                 for x in range(0, image.width // self.tile_size):
-                    image_tiles.append(
-                        image.crop(
-                            (
-                                x * self.tile_size,
-                                0,
-                                (x + 1) * self.tile_size,
-                                self.tile_size,
-                            )
+                    new_tiles.append(
+                        FontTile(
+                            image_data[
+                                x * self.tile_data_length : (x + 1) * self.tile_data_length
+                            ],
+                            self.tile_size,
                         )
                     )
 
-                # Convert tiles into FontTiles.
-                for tile in image_tiles:
-                    converted_tile = tile.getdata(0)
-                    array = b""
-                    for y in range(0, self.tile_size, 2):
-                        # Read each byte of converted_tile and convert into two pixels at a time vertically. Each byte is two 4-bit values, with the right nybble on top and the left nybble on the bottom.
-                        for x in range(0, self.tile_size):
-                            hi_pixel = converted_tile[x + y * self.tile_size] >> 4
-                            lo_pixel = (
-                                converted_tile[x + ((y + 1) * self.tile_size)] & 0xF0
-                            )
-                            array += struct.pack("=B", lo_pixel | hi_pixel)
-                    new_tiles.append(FontTile(array, self.tile_size))
-
             new_tiles_bitmap = Utils.create_tile_bitmap(
                 new_tiles, 0, len(new_tiles), 1, len(new_tiles), self.tile_size, 1, True
             )
@@ -439,8 +455,10 @@ class MainFrame(wx.Frame):
                 self.tile_offset = value
             elif name == "TileRows":
                 self.tile_rows = value
+                self.tiles.fit_cache(self.tile_rows * self.tile_cols)
             elif name == "TileCols":
                 self.tile_cols = value
+                self.tiles.fit_cache(self.tile_rows * self.tile_cols)
             elif name == "TileScale":
                 self.tile_scale = value
             elif name == "Invert":
@@ -1068,33 +1086,120 @@ class FontTile:
     size: int
     "Length of this tile image in pixels."
 
-    def __init__(self, data, size):
+    pixels: np.ndarray
+    "Array with the shape (size, size) containing the pixel values of this tile."
+
+    def __init__(self, data, size, pixels: np.ndarray = None):
         self.data = data
         self.size = size
-        array = [[0] * self.size for _ in range(0, self.size)]
-
-        for y in range(0, self.size // 2):
-            # Read two pixels at a time vertically. Each byte is two 4-bit values, with the right nybble on top and the left nybble on the bottom.
-            lo_pixels = []
-            hi_pixels = []
-            for x in range(0, self.size):
-                byte = data[x + (y * self.size)]
-                lo_pixels.append((byte >> 4) * 16)
-                hi_pixels.append((byte & 0xF) * 16)
-            array[y * 2] = hi_pixels
-            array[(y * 2) + 1] = lo_pixels
-
-        # Flatten list of lists.
-        flat_array = []
-        for i in array:
-            flat_array += i
-
-        # Convert monochrome pixel data to RGB, as conversion to mode L causes loss of precision.
-        pixel_data = b""
-        for i in flat_array:
-            pixel_data += bytes((i, i, i))
-
-        self.image = Image.frombytes("RGB", (self.size, self.size), pixel_data)
+        if pixels is None:
+            pixels = skfont.decode_tiles(data, size, 1)[0]
+        self.pixels = pixels
+
+    @cached_property
+    def image(self) -> Image.Image:
+        """PIL Image of this tile, created on first access."""
+
+        # Convert monochrome pixel data to RGB to match the tile grid.
+        return Image.fromarray(np.repeat(self.pixels[:, :, np.newaxis], 3, axis=2), "RGB")
+
+
+class FontTileSet:
+    """Contains the binary data for all SKFONT.CG tiles and the pixel values of all tiles,
+    decoded at once into a single array. Indexing returns a FontTile whose pixels are a view
+    of this array. FontTile objects are created on first access and held in a bounded LRU
+    cache, so only the tiles that have been viewed recently keep their images."""
+
+    CACHE_SIZE = 1024
+    "Minimum number of FontTile objects kept in the cache."
+
+    RENDER_CACHE_LIMIT = 64 * 1024 * 1024
+    "Maximum size in bytes of the sheet rendered by render()."
+
+    data: bytearray
+    "Bytes representing all font tiles. Replacing a tile writes into this buffer in place."
+
+    pixels: np.ndarray
+    "Array with the shape (count, size, size) containing the pixel values of all tiles."
+
+    def __init__(self, data, size, count):
+        self.size = size
+        self.count = count
+        self.tile_data_length = (size**2) // 2
+        self.data = bytearray(data[: count * self.tile_data_length])
+        self.pixels = skfont.decode_tiles(self.data, size, count)
+        self.cache_size = self.CACHE_SIZE
+        self._cache = OrderedDict()
+        self._render = self.pixels
+        self._render_scale = 1
+        self._dirty = set()
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index: int) -> FontTile:
+        if not 0 <= index < self.count:
+            raise IndexError(f"Tile {index} out of range")
+
+        tile = self._cache.get(index)
+        if tile is None:
+            start = index * self.tile_data_length
+            tile = FontTile(
+                bytes(self.data[start : start + self.tile_data_length]),
+                self.size,
+                self.pixels[index],
+            )
+            self._cache[index] = tile
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(index)
+
+        return tile
+
+    def __setitem__(self, index: int, tile: FontTile):
+        """Replace the data and pixels of tile index with those of tile."""
+
+        if not 0 <= index < self.count:
+            raise IndexError(f"Tile {index} out of range")
+
+        if len(tile.data) != self.tile_data_length:
+            raise ValueError(f"Tile data must be {self.tile_data_length} bytes")
+
+        start = index * self.tile_data_length
+        self.data[start : start + self.tile_data_length] = tile.data
+        self.pixels[index] = tile.pixels
+        self._cache.pop(index, None)
+        self._dirty.add(index)
+
+    def render(self, scale: int, start: int, end: int) -> np.ndarray:
+        """Return the pixels of tiles start to end enlarged by scale, with the shape
+        (end - start, size * scale, size * scale).
+
+        The whole sheet is rendered once at the current scale and sliced for each call.
+        Tiles replaced since then are rendered again individually. If the rendered sheet
+        would exceed RENDER_CACHE_LIMIT bytes, only the requested tiles are rendered."""
+
+        if self.count * (self.size * scale) ** 2 > self.RENDER_CACHE_LIMIT:
+            return Utils.scale_tiles(self.pixels[start:end], scale)
+
+        if self._render_scale != scale:
+            self._render = Utils.scale_tiles(self.pixels, scale)
+            self._render_scale = scale
+            self._dirty.clear()
+        elif self._dirty:
+            for i in self._dirty:
+                self._render[i] = Utils.scale_tiles(self.pixels[i : i + 1], scale)[0]
+            self._dirty.clear()
+
+        return self._render[start:end]
+
+    def fit_cache(self, visible_tiles: int):
+        """Make the cache large enough to hold visible_tiles tiles."""
+
+        self.cache_size = max(self.CACHE_SIZE, visible_tiles)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
 
 
 if __name__ == "__main__":
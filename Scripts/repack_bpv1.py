@@ -1,68 +1,110 @@
 # This script reads a file containing BPV1 chunks and repacks the PVR textures as extracted by extract_bpv1.py.
-# The PNG files accompanying each PVR texture are converted to the PVR texture, overwriting the PVR file.
-# DOSPVR, the default utility for generating PVR textures, writes backups of PVR files before overwriting.
+# The PNG files accompanying each PVR texture are encoded in the format of the PVR texture,
+# and the new PVR files are written to the pvr_output subdirectory.
+# The input file is patched in place, writing only the textures that changed. With -o, the input file
+# is copied to the output path and the copy is patched instead.
 # PVR format information is based on https://github.com/nickworonekin/puyotools/wiki/PVR-Texture
-
-# TODO: Add PRS support.
-
+# VQ textures are encoded with the codebook training preset set by --vq-quality, and their PSNR is printed.
+#
+# The SHA-1 hash of each PNG file and of the texture data written for it are saved next to the
+# input file with the extension .manifest.json. On later runs, textures whose PNG file is unchanged
+# are copied from the input file instead of being encoded again, as long as the input file still
+# contains the data written for them. Use -f to encode all textures.
+# With -o, the manifest of the input file is used for the copy, and the manifest is saved next to
+# the output file. If the output file already has a manifest from an earlier run, unchanged
+# textures are copied from the earlier output file instead.
+#
+# With -c, the input file contains PRS-compressed BPV1 chunks, as extracted by extract_bpv1.py -c.
+# Each chunk is decompressed, repacked, and compressed again, using -j worker processes. The
+# compressed chunk must fit in the space of the original chunk, and the remaining space is filled
+# with byte 00. Chunks that exceed the original space are reported and left unchanged. The space
+# of each chunk is saved with the extension .slots.json, so that it still includes the zero fill
+# on later runs.
+# NumPy and Pillow are required as dependencies.
+
+import argparse
+import hashlib
+import json
 import mmap
 import os
+import shutil
 import struct
-import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from typing import NamedTuple
 
+from PIL import Image
+
+from utils import bpv1, chunks, pool, prs, pvr, vq
+from utils.pvr import PVRError
+
 path = os.path.realpath(os.path.dirname(sys.argv[0]))
 
-# Set these to the path and arguments of a utility that accepts a PNG file and outputs a PVR file.
-# It is recommended that the arguments include a switch that suppresses console output, if available.
-png2pvr_path = os.path.join(path, os.path.normpath(r".\lib\dospvr.exe"))
+MANIFEST_EXTENSION = ".manifest.json"
+# Extension of the previous output file while it is read for unchanged textures.
+PREVIOUS_EXTENSION = ".prev"
+MANIFEST_VERSION = 1
+
+
+def load_manifest(bpv1_file: str) -> dict:
+    """Read the repack manifest for bpv1_file. Returns an empty dict if
+    there is no manifest or it cannot be read."""
 
-# fmt: off
-PVR_PIXEL_FORMATS = {0: ("-cf", "1555",), 1: ("-cf", "565",), 2: ("-cf", "4444",)}
+    manifest_filename = bpv1_file + MANIFEST_EXTENSION
+    if not os.path.isfile(manifest_filename):
+        return {}
 
-PVR_DATA_FORMATS = {
-    0x1: ("-tw",),          # Square, twiddled
-    0x2: ("-tw", "-mm",),   # Square, twiddled, mipmaps
-    0x3: ("-vq",),          # VQ
-    0x4: ("-vq", "-mm",),   # VQ, mipmaps
-    0x5: ("-pd 4",),        # 4bpp indexed
-    0x7: ("-pd 8",),        # 8bpp indexed
-    0x9: (),                # Rectangle
-    0xD: ("-tw",),          # Rectangle, twiddled
-    0x10: ("-vq",),         # Small VQ
-    0x11: ("-vq", "-tw",),  # Small VQ, twiddled
-    0x12: ("-tw", "-mm",),  # Square, twiddled, mipmaps (alternate)
-}
-# fmt: on
+    try:
+        with open(manifest_filename, encoding="utf-8") as manifest_file:
+            saved = json.load(manifest_file)
+        if saved["version"] == MANIFEST_VERSION:
+            return saved["textures"]
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"[Warning] {manifest_filename}: Unable to read manifest: {e}")
 
+    return {}
 
-class PVRInfo(NamedTuple):
-    offset: int
-    pixel_format: int
-    data_format: int
-    width: int
-    height: int
 
+def save_manifest(bpv1_file: str, manifest: dict):
+    """Write the repack manifest for bpv1_file."""
 
-class PVRError(Exception):
-    pass
+    manifest_filename = bpv1_file + MANIFEST_EXTENSION
+    try:
+        with open(manifest_filename, "w", encoding="utf-8") as manifest_file:
+            json.dump(
+                {"version": MANIFEST_VERSION, "textures": manifest}, manifest_file, indent=1
+            )
+    except OSError as e:
+        print(f"[Warning] {manifest_filename}: Unable to write manifest: {e}")
 
 
 def repack_bpv1(
-    bpv1_tables: bytes,
-    texture_count: int,
+    bpv1_table: bpv1.BPV1Table,
     pvr_files: list,
     png_files: list,
     pvr_output_path: str,
-) -> tuple[bytes, int]:
-    """Recreate a BPV1 chunk, using the original BPV1 offset tables and
-    new PVR textures.
+    vq_quality="normal",
+    jobs=1,
+    chunk_data: bytes = None,
+    manifest: dict = None,
+) -> tuple[bytes, list[int], list[int]]:
+    """Recreate a BPV1 chunk, using the original BPV1 offset tables parsed
+    by bpv1.read_bpv1 and new PVR textures.
 
     The lists of pvr_files and png_files must be sorted before passing in.
+    vq_quality and jobs are passed to pvr.encode_texture for VQ textures.
 
-    Returns a tuple containing the new chunk and the number of textures
-    that were successfully repacked."""
+    If chunk_data, the current contents of the chunk, and manifest, a dict
+    returned by load_manifest, are specified, textures whose PNG file and
+    chunk data are unchanged since the last repack are copied from
+    chunk_data instead of being encoded. manifest is updated with the
+    textures that are encoded.
+
+    Returns a tuple containing the new chunk, starting after the chunk
+    header, the indexes of the textures that were successfully repacked,
+    and the indexes of the unchanged textures."""
+
+    texture_count = len(bpv1_table.textures)
 
     if len(pvr_files) != texture_count:
         raise PVRError("Amount of PVR files does not match texture_count")
@@ -70,37 +112,23 @@ def repack_bpv1(
     if len(png_files) != texture_count:
         raise PVRError("Amount of PNG files does not match texture_count")
 
-    pvr_table_offsets = []
-    for i in range(0, texture_count * 12, 12):
-        pvr_table_offsets.append(struct.unpack("<I", bpv1_tables[i : i + 4])[0])
-
-    bpv1_info_table: list[PVRInfo] = []
-    for i in pvr_table_offsets:
-        i -= 8
-        offset = struct.unpack("<I", bpv1_tables[i : i + 4])[0]
-        pixel_format = int(bpv1_tables[i + 6])
-        data_format = int(bpv1_tables[i + 7])
-        width = struct.unpack("<I", bpv1_tables[i + 16 : i + 20])[0]
-        height = struct.unpack("<I", bpv1_tables[i + 20 : i + 24])[0]
-
-        bpv1_info_table.append(
-            PVRInfo(offset, pixel_format, data_format, width, height)
-        )
-
     pvr_pixels_data = bytearray()
-    textures_repacked = 0
-    for bpv1_info, pvr_file, png_file in zip(bpv1_info_table, pvr_files, png_files):
-        with open(pvr_file, "rb") as pvr:
-            if (header := pvr.read(4)) != b"PVRT":
+    textures_repacked = []
+    textures_unchanged = []
+    for i, (bpv1_info, pvr_file, png_file) in enumerate(
+        zip(bpv1_table.textures, pvr_files, png_files)
+    ):
+        with open(pvr_file, "rb") as pvr_input:
+            if (header := pvr_input.read(4)) != b"PVRT":
                 raise ValueError(f"{pvr_file}: Header not recognized: {header}")
 
-            pvr.seek(8)
-            pvr_pixel_format = int.from_bytes(pvr.read(1))
-            pvr_data_format = int.from_bytes(pvr.read(1))
-            pvr.read(2)
-            pvr_width = struct.unpack("<H", pvr.read(2))[0]
-            pvr_height = struct.unpack("<H", pvr.read(2))[0]
-            pvr_data = pvr.read()
+            pvr_input.seek(8)
+            pvr_pixel_format = int.from_bytes(pvr_input.read(1))
+            pvr_data_format = int.from_bytes(pvr_input.read(1))
+            pvr_input.read(2)
+            pvr_width = struct.unpack("<H", pvr_input.read(2))[0]
+            pvr_height = struct.unpack("<H", pvr_input.read(2))[0]
+            pvr_data = pvr_input.read()
 
             # Verify input PVR data.
             if pvr_pixel_format != bpv1_info.pixel_format:
@@ -132,117 +160,224 @@ def repack_bpv1(
                         f"Dimensions of PNG file {os.path.basename(png_file)} ({width}x{height}) do not match PVR file ({pvr_width}x{pvr_height})"
                     )
 
+            # Skip textures that are unchanged since they were last repacked.
+            with open(png_file, "rb") as png:
+                png_sha1 = hashlib.sha1(png.read()).hexdigest()
+            png_key = os.path.basename(png_file)
+            is_vq = pvr_data_format in pvr.DATA_FORMATS and pvr.DATA_FORMATS[
+                pvr_data_format
+            ].layout in ("vq", "small_vq")
+            manifest_entry = {
+                "png_sha1": png_sha1,
+                "vq_quality": vq_quality if is_vq else None,
+            }
+
+            if manifest is not None and chunk_data is not None:
+                start, end = bpv1_table.texture_range(i)
+                current_pixels = bytes(chunk_data[start:end])
+                if (
+                    (saved := manifest.get(png_key))
+                    and saved["png_sha1"] == manifest_entry["png_sha1"]
+                    and saved["vq_quality"] == manifest_entry["vq_quality"]
+                    and saved["payload_sha1"] == hashlib.sha1(current_pixels).hexdigest()
+                ):
+                    pvr_pixels_data.extend(current_pixels)
+                    textures_unchanged.append(i)
+                    continue
+
             # Do PNG to PVR conversion.
-            png2pvr_args = [
-                png2pvr_path,
-                "-q",
-                png_file,
-                *PVR_DATA_FORMATS[pvr_data_format],
-                *PVR_PIXEL_FORMATS[pvr_pixel_format],
-                "-op",
-                pvr_output_path,
-            ]
-            subprocess.run(png2pvr_args, shell=True)
-
-            # Verify output.
+            # The encoded data is padded with the remaining data of the original texture, if any.
+            try:
+                with Image.open(png_file) as im:
+                    pixels = pvr.from_image(im)
+                new_pvr_pixels = pvr.encode_texture(
+                    pixels, pvr_pixel_format, pvr_data_format, vq_quality=vq_quality, jobs=jobs
+                )
+
+                if is_vq:
+                    decoded = pvr.decode_texture(
+                        new_pvr_pixels, pvr_pixel_format, pvr_data_format, pvr_width, pvr_height
+                    )
+                    print(
+                        f"{os.path.basename(png_file)}: VQ texture encoded with PSNR {vq.psnr(pixels, decoded):.2f} dB."
+                    )
+
+                if len(new_pvr_pixels) > len(pvr_data):
+                    raise PVRError(
+                        f"Size of generated PVR data for {os.path.basename(png_file)} ({len(new_pvr_pixels)}) exceeds original PVR data at offset {hex(bpv1_info.offset)} ({len(pvr_data)})"
+                    )
+
+                new_pvr_pixels += pvr_data[len(new_pvr_pixels) :]
+                textures_repacked.append(i)
+
+                if manifest is not None:
+                    manifest_entry["payload_sha1"] = hashlib.sha1(new_pvr_pixels).hexdigest()
+                    manifest[png_key] = manifest_entry
+
+            except PVRError as e:
+                print(f"Error: {e}. Skipping this PVR file.")
+                new_pvr_pixels = pvr_data
+                if manifest is not None:
+                    manifest.pop(png_key, None)
+
             with open(
-                os.path.join(pvr_output_path, os.path.basename(pvr_file)), "rb"
+                os.path.join(pvr_output_path, os.path.basename(pvr_file)), "wb"
             ) as new_pvr:
-                new_pvr.seek(8)
-                new_pvr_pixel_format = int.from_bytes(new_pvr.read(1))
-                new_pvr_data_format = int.from_bytes(new_pvr.read(1))
-                new_pvr.read(2)
-                new_pvr_width = struct.unpack("<H", new_pvr.read(2))[0]
-                new_pvr_height = struct.unpack("<H", new_pvr.read(2))[0]
+                new_pvr.write(
+                    b"PVRT"
+                    + struct.pack(
+                        "<IBBHHH",
+                        len(new_pvr_pixels) + 8,
+                        pvr_pixel_format,
+                        pvr_data_format,
+                        0,
+                        pvr_width,
+                        pvr_height,
+                    )
+                    + new_pvr_pixels
+                )
 
-                try:
-                    if new_pvr_pixel_format != bpv1_info.pixel_format:
-                        raise PVRError(
-                            f"Pixel format of generated PVR file for {os.path.basename(png_file)} ({hex(new_pvr_pixel_format)}) does not match BPV1 pixel format at offset {hex(bpv1_info.offset)} ({hex(bpv1_info.pixel_format)})"
-                        )
+            pvr_pixels_data.extend(new_pvr_pixels)
 
-                    if new_pvr_data_format != bpv1_info.data_format:
-                        raise PVRError(
-                            f"Data format of generated PVR file for {os.path.basename(png_file)} ({hex(new_pvr_data_format)}) does not match BPV1 data format at offset {hex(bpv1_info.offset)} ({hex(bpv1_info.data_format)})"
-                        )
+    return (bpv1_table.tables + pvr_pixels_data, textures_repacked, textures_unchanged)
 
-                    if (
-                        new_pvr_width != bpv1_info.width
-                        or new_pvr_height != bpv1_info.height
-                    ):
-                        raise PVRError(
-                            f"Dimensions of generated PVR file for {os.path.basename(png_file)} ({new_pvr_width}x{new_pvr_height}) do not match BPV1 dimensions at offset {hex(bpv1_info.offset)} ({bpv1_info.width}x{bpv1_info.height})"
-                        )
 
-                    new_pvr_pixels = new_pvr.read()
-                    textures_repacked += 1
+def find_texture_files(
+    bpv1_file: str, bpv1_pos: int, texture_count: int
+) -> tuple[list, list]:
+    """Find the PVR and PNG files for the textures of the BPV1 chunk at
+    bpv1_pos in bpv1_file.
 
-                except PVRError as e:
-                    print(f"Error: {e}. Skipping this PVR file.")
-                    new_pvr_pixels = pvr_data
+    Returns a tuple containing the lists of PVR files and PNG files."""
+
+    pvr_files = []
+    png_files = []
+    for j in range(texture_count):
+        # Get PVR texture files.
+        # PVR and PNG files are named for the input file, followed by offset and a 3-digit number.
+        bpv1_subtexture_basename = f"{bpv1_file}_{hex(bpv1_pos)}_{str(j).zfill(3)}"
+
+        pvr_filename = bpv1_subtexture_basename + ".pvr"
+        if os.path.exists(pvr_filename):
+            pvr_files.append(pvr_filename)
+        else:
+            print(f"Error: PVR texture file #{str(j).zfill(3)} not found for {bpv1_file}")
+            continue
+
+        # Search for matching PNG files.
+        png_filename = bpv1_subtexture_basename + ".png"
+        if os.path.exists(png_filename):
+            png_files.append(png_filename)
+        else:
+            print(f"Error: PNG file {png_filename} not found for {bpv1_file}")
+            continue
+
+    return (pvr_files, png_files)
+
+
+def prepare_output(
+    bpv1_file: str, output_file: str = None, force=False
+) -> tuple[str, str, dict]:
+    """Return a tuple containing the file to be patched, the file containing
+    the texture data described by the manifest, and the manifest. The
+    manifest is empty if force is True.
+
+    If output_file is specified, bpv1_file is copied to it first, without
+    reading the whole file into memory. The copy has the same contents as
+    bpv1_file, so the manifest of bpv1_file applies to it. If output_file
+    already exists with a manifest from an earlier run, it is moved to
+    output_file + PREVIOUS_EXTENSION first, so that the textures written by
+    that run can be reused, and its manifest is used instead. Remove that
+    file with cleanup_output after patching."""
+
+    if output_file is None or os.path.abspath(output_file) == os.path.abspath(bpv1_file):
+        return (bpv1_file, bpv1_file, {} if force else load_manifest(bpv1_file))
+
+    reference_file = output_file
+    manifest = {} if force else load_manifest(bpv1_file)
+    if not force and os.path.isfile(output_file) and (output_manifest := load_manifest(output_file)):
+        reference_file = output_file + PREVIOUS_EXTENSION
+        os.replace(output_file, reference_file)
+        manifest = output_manifest
+
+    shutil.copyfile(bpv1_file, output_file)
+    return (output_file, reference_file, manifest)
 
-            pvr_pixels_data.extend(new_pvr_pixels)
 
-    return (bpv1_tables + pvr_pixels_data, textures_repacked)
+def cleanup_output(target_file: str, reference_file: str):
+    """Remove the previous output file kept by prepare_output, if any."""
 
+    if reference_file != target_file and os.path.isfile(reference_file):
+        os.remove(reference_file)
 
-def search_bpv1(bpv1_file: str):
-    """Open a file containing uncompressed BPV1 chunks and retrieve their locations."""
+
+def patch(mm: mmap.mmap, offset: int, data: bytes) -> bool:
+    """Write data to mm at offset if it differs from the current contents.
+
+    Returns True if data was written."""
+
+    if mm[offset : offset + len(data)] == data:
+        return False
+
+    mm[offset : offset + len(data)] = data
+    return True
+
+
+def search_bpv1(
+    bpv1_file: str, vq_quality="normal", jobs=1, force=False, output_file=None
+):
+    """Open a file containing uncompressed BPV1 chunks and retrieve their locations.
+    Textures that are unchanged according to the manifest are not encoded
+    again, unless force is True.
+
+    The file is patched in place, or a copy of it is patched if output_file
+    is specified. Only textures that changed are written."""
 
     total_bpv1_texture_count = 0
     total_textures_repacked = 0
+    total_textures_unchanged = 0
+    textures_patched = 0
+    target_file, reference_file, manifest = prepare_output(bpv1_file, output_file, force)
 
-    with open(bpv1_file, "rb") as f:
+    with open(target_file, "r+b") as f, open(reference_file, "rb") as reference:
         pvr_output_path = os.path.join(os.path.dirname(bpv1_file), "pvr_output")
         os.makedirs(pvr_output_path, exist_ok=True)
 
-        # Find all BPV1 header locations.
-        with mmap.mmap(
-            f.fileno(), 0, access=mmap.ACCESS_READ | mmap.ACCESS_WRITE
-        ) as mm:
-            bpv1_locations = [
-                i for i in range(0, len(mm), 4) if mm[i : i + 4] == b"BPV1"
-            ]
+        # Find all BPV1 header locations. Unchanged textures are read from the reference file,
+        # which is the previous output file when writing to an output file again.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as mm, mmap.mmap(
+            reference.fileno(), 0, access=mmap.ACCESS_READ
+        ) as reference_mm:
+            bpv1_locations = [i.offset for i in chunks.scan_chunks(mm, (b"BPV1",))]
 
             for i in bpv1_locations:
                 # Get header for BPV1 chunk.
                 # bpv1_chunk_size includes 8 bytes of subheader length and texture count.
-                bpv1_chunk_size = struct.unpack("<I", mm[i + 4 : i + 8])[0]
-                bpv1_texture_count = struct.unpack("<I", mm[i + 12 : i + 16])[0]
+                warnings = []
+                try:
+                    bpv1_table = bpv1.read_bpv1(mm, i, warnings)
+                except bpv1.BPV1Error as e:
+                    print(f"Error: {e}. Skipping this BPV1 chunk.")
+                    continue
+                for warning in warnings:
+                    print(f"Warning: {warning}.")
+                bpv1_chunk_size = bpv1_table.size
+                bpv1_texture_count = len(bpv1_table.textures)
                 total_bpv1_texture_count += bpv1_texture_count
-                bpv1_tables = mm[i + 16 : i + 16 + bpv1_texture_count * 56]
-
-                pvr_files = []
-                png_files = []
-                for j in range(bpv1_texture_count):
-                    # Get PVR texture files.
-                    # PVR and PNG files are named for the input file, followed by offset and a 3-digit number.
-                    bpv1_subtexture_basename = f"{bpv1_file}_{hex(i)}_{str(j).zfill(3)}"
-
-                    pvr_filename = bpv1_subtexture_basename + ".pvr"
-                    if os.path.exists(pvr_filename):
-                        pvr_files.append(pvr_filename)
-                    else:
-                        print(
-                            f"Error: PVR texture file #{str(j).zfill(3)} not found for {bpv1_file}"
-                        )
-                        continue
 
-                    # Search for matching PNG files.
-                    png_filename = bpv1_subtexture_basename + ".png"
-                    if os.path.exists(png_filename):
-                        png_files.append(png_filename)
-                    else:
-                        print(f"Error: PNG file {png_filename} not found for {bpv1_file}")
-                        continue
+                pvr_files, png_files = find_texture_files(bpv1_file, i, bpv1_texture_count)
 
-                repacked_bpv1, textures_repacked = repack_bpv1(
-                    bpv1_tables,
-                    bpv1_texture_count,
+                repacked_bpv1, textures_repacked, textures_unchanged = repack_bpv1(
+                    bpv1_table,
                     pvr_files,
                     png_files,
                     pvr_output_path,
+                    vq_quality,
+                    jobs,
+                    reference_mm[i : i + 8 + bpv1_chunk_size],
+                    manifest,
                 )
+                total_textures_unchanged += len(textures_unchanged)
 
                 repacked_bpv1_size = len(repacked_bpv1)
                 if repacked_bpv1_size != bpv1_chunk_size - 8:
@@ -250,28 +385,286 @@ def search_bpv1(bpv1_file: str):
                         f"Size of repacked BPV1 chunk for {bpv1_file} at {hex(i)} ({repacked_bpv1_size + 8}) does not match original chunk ({bpv1_chunk_size + 8})"
                     )
 
-                mm[i + 16 : i + 16 + repacked_bpv1_size] = repacked_bpv1
+                # Write only the data of repacked textures. Unchanged textures are already in the
+                # file, unless they were read from the previous output file.
+                patched_textures = textures_repacked
+                if reference_file != target_file:
+                    patched_textures = sorted(textures_repacked + textures_unchanged)
+                for texture in patched_textures:
+                    start, end = bpv1_table.texture_range(texture)
+                    textures_patched += patch(mm, i + start, repacked_bpv1[start - 16 : end - 16])
+
                 if textures_repacked:
                     print(
-                        f"{bpv1_file}: Repacked {bpv1_texture_count} textures at {hex(i)}."
+                        f"{bpv1_file}: Repacked {len(textures_repacked)} textures at {hex(i)}."
+                    )
+                    total_textures_repacked += len(textures_repacked)
+
+            if textures_patched:
+                mm.flush()
+
+    cleanup_output(target_file, reference_file)
+    if total_textures_repacked or target_file != bpv1_file:
+        save_manifest(target_file, manifest)
+
+    print(
+        f"Repacked {total_textures_repacked} out of {total_bpv1_texture_count} textures into {target_file}. {total_textures_unchanged} textures were unchanged."
+    )
+
+
+class CompressedRepackResult(NamedTuple):
+    bpv1_pos: int
+    output: bytes
+    "The recompressed chunk, or None if no textures were repacked or an error occurred."
+    texture_count: int
+    textures_repacked: int
+    textures_unchanged: int
+    manifest_changes: dict
+    "Manifest entries of the PNG files of this chunk. Entries that were removed are None."
+    messages: list
+
+
+def repack_compressed_bpv1(
+    bpv1_file: str,
+    bpv1_pos: int,
+    cprs_data: bytes,
+    pvr_output_path: str,
+    vq_quality="normal",
+    manifest: dict = None,
+) -> CompressedRepackResult:
+    """Decompress the PRS-compressed BPV1 chunk in cprs_data, located at
+    bpv1_pos in bpv1_file, repack its textures, and compress it again.
+    This function is run in a worker process by search_compressed_bpv1."""
+
+    messages = []
+    warnings = []
+    try:
+        decompressed = prs.decompress(cprs_data)
+        bpv1_table = bpv1.read_bpv1(decompressed, 0, warnings)
+    except (prs.PRSError, bpv1.BPV1Error, struct.error) as e:
+        messages.append(
+            f"Error: BPV1 chunk at {hex(bpv1_pos)}: {e}. Skipping this BPV1 chunk."
+        )
+        return CompressedRepackResult(bpv1_pos, None, 0, 0, 0, {}, messages)
+    for warning in warnings:
+        messages.append(f"Warning: BPV1 chunk at {hex(bpv1_pos)}: {warning}.")
+
+    texture_count = len(bpv1_table.textures)
+    pvr_files, png_files = find_texture_files(bpv1_file, bpv1_pos, texture_count)
+
+    manifest = dict(manifest) if manifest is not None else None
+    try:
+        repacked_bpv1, textures_repacked, textures_unchanged = repack_bpv1(
+            bpv1_table,
+            pvr_files,
+            png_files,
+            pvr_output_path,
+            vq_quality,
+            1,
+            decompressed,
+            manifest,
+        )
+    except (PVRError, ValueError) as e:
+        messages.append(
+            f"Error: BPV1 chunk at {hex(bpv1_pos)}: {e}. Skipping this BPV1 chunk."
+        )
+        return CompressedRepackResult(bpv1_pos, None, texture_count, 0, 0, {}, messages)
+    manifest_changes = {}
+    if manifest is not None:
+        manifest_changes = {
+            os.path.basename(i): manifest.get(os.path.basename(i)) for i in png_files
+        }
+
+    output = None
+    if textures_repacked:
+        # Splice the repacked tables and textures into the decompressed chunk.
+        new_chunk = (
+            decompressed[:16]
+            + repacked_bpv1
+            + decompressed[16 + len(repacked_bpv1) :]
+        )
+        try:
+            output = prs.compress(new_chunk)
+        except prs.PRSError as e:
+            messages.append(
+                f"Error: BPV1 chunk at {hex(bpv1_pos)}: {e}. Skipping this BPV1 chunk."
+            )
+            textures_repacked = []
+
+    return CompressedRepackResult(
+        bpv1_pos,
+        output,
+        texture_count,
+        len(textures_repacked),
+        len(textures_unchanged),
+        manifest_changes,
+        messages,
+    )
+
+
+def search_compressed_bpv1(
+    bpv1_file: str, vq_quality="normal", jobs=1, force=False, output_file=None
+):
+    """Open a file containing PRS-compressed BPV1 chunks, as extracted by
+    extract_bpv1.py -c, and repack them. Chunks are decompressed, repacked,
+    and compressed in up to jobs worker processes.
+
+    Each compressed chunk must fit in the space of the original chunk,
+    including its footers. Remaining space is filled with byte 00. Chunks
+    that do not fit are reported and left unchanged.
+
+    The file is patched in place, or a copy of it is patched if output_file
+    is specified."""
+
+    total_bpv1_texture_count = 0
+    total_textures_repacked = 0
+    total_textures_unchanged = 0
+    overflows = []
+
+    pvr_output_path = os.path.join(os.path.dirname(bpv1_file), "pvr_output")
+    os.makedirs(pvr_output_path, exist_ok=True)
+
+    # The index of the input file also applies to the copy. The space of each chunk is its
+    # original length, which includes the zero fill after chunks that were repacked before.
+    bpv1_chunks = chunks.filter_chunks(chunks.load_index(bpv1_file), b"BPV1")
+    slot_lengths = chunks.load_slots(bpv1_file, bpv1_chunks)
+
+    target_file, reference_file, manifest = prepare_output(bpv1_file, output_file, force)
+    if target_file != bpv1_file:
+        chunks.save_slots(target_file, slot_lengths)
+    chunks_patched = 0
+    reference_lengths = {}
+
+    with open(target_file, "r+b") as f, open(reference_file, "rb") as reference:
+        # Unchanged textures are read from the reference file, which is the previous output file
+        # when writing to an output file again. Its chunks may be shorter than the original chunks.
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_WRITE) as mm, mmap.mmap(
+            reference.fileno(), 0, access=mmap.ACCESS_READ
+        ) as reference_mm:
+
+            def tasks():
+                # Each chunk is read only when it is submitted to the pool.
+                for i in bpv1_chunks:
+                    length = i.compressed_length
+                    if reference_file != target_file:
+                        (info,) = chunks.describe_chunks(reference_mm, [(i.offset, b"BPV1")])
+                        length = info.compressed_length
+                    reference_lengths[i.offset] = length
+                    yield (
+                        bpv1_file,
+                        i.offset,
+                        reference_mm[i.offset : i.offset + length],
+                        pvr_output_path,
+                        vq_quality,
+                        manifest,
+                    )
+
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                for result in pool.imap_unordered(
+                    executor, repack_compressed_bpv1, tasks(), jobs * 2
+                ):
+                    for message in result.messages:
+                        print(message)
+
+                    total_bpv1_texture_count += result.texture_count
+                    total_textures_unchanged += result.textures_unchanged
+                    slot_length = slot_lengths[result.bpv1_pos]
+                    if result.output is None:
+                        # Chunks whose textures are all unchanged since the previous output file
+                        # are copied from it.
+                        if result.textures_unchanged and reference_file != target_file:
+                            cprs_data = reference_mm[
+                                result.bpv1_pos : result.bpv1_pos
+                                + reference_lengths[result.bpv1_pos]
+                            ]
+                            chunks_patched += patch(
+                                mm,
+                                result.bpv1_pos,
+                                cprs_data + b"\x00" * (slot_length - len(cprs_data)),
+                            )
+                        continue
+
+                    if len(result.output) > slot_length:
+                        overflows.append(
+                            (result.bpv1_pos, len(result.output) - slot_length)
+                        )
+                        continue
+
+                    chunks_patched += patch(
+                        mm,
+                        result.bpv1_pos,
+                        result.output + b"\x00" * (slot_length - len(result.output)),
+                    )
+                    for key, entry in result.manifest_changes.items():
+                        if entry is None:
+                            manifest.pop(key, None)
+                        else:
+                            manifest[key] = entry
+
+                    print(
+                        f"{bpv1_file}: Repacked {result.textures_repacked} textures at {hex(result.bpv1_pos)}. {slot_length - len(result.output)} bytes free."
                     )
-                    total_textures_repacked += textures_repacked
+                    total_textures_repacked += result.textures_repacked
 
-            output = bytes(mm)
+            if chunks_patched:
+                mm.flush()
 
-    with open(bpv1_file, "wb") as file:
-        file.write(output)
+    cleanup_output(target_file, reference_file)
+    if total_textures_repacked or target_file != bpv1_file:
+        save_manifest(target_file, manifest)
+
+    for bpv1_pos, overflow in sorted(overflows):
         print(
-            f"Repacked {total_textures_repacked} out of {total_bpv1_texture_count} textures into {bpv1_file}."
+            f"Error: Compressed BPV1 chunk at {hex(bpv1_pos)} exceeds the original chunk by {overflow} bytes. This chunk was not repacked."
         )
 
+    print(
+        f"Repacked {total_textures_repacked} out of {total_bpv1_texture_count} textures into {target_file}. {total_textures_unchanged} textures were unchanged."
+    )
+
 
 def main():
-    if len(sys.argv) > 1:
-        for i in sys.argv[1:]:
-            search_bpv1(i)
-    else:
-        print("Specify input BPV1 file(s).")
+    parser = argparse.ArgumentParser(
+        description="Repack PNG files into the BPV1 chunks they were extracted from."
+    )
+    parser.add_argument("files", nargs="+", help="Input file(s) containing BPV1 chunks.")
+    parser.add_argument(
+        "--vq-quality",
+        choices=vq.QUALITY_PRESETS,
+        default="normal",
+        help="Codebook training preset for VQ textures. Use fast while editing and high for release.",
+    )
+    parser.add_argument(
+        "-c", action="store_true", help="Input is PRS-compressed BPV1 data."
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of threads used to encode VQ textures, or with -c, number of worker processes used for BPV1 chunks.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help="Write the repacked file to this path instead of modifying the input file. Only valid with one input file.",
+    )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Encode all textures, ignoring the manifest.",
+    )
+    args = parser.parse_args()
+
+    if args.output and len(args.files) > 1:
+        parser.error("-o can only be used with one input file.")
+
+    for i in args.files:
+        if args.c:
+            search_compressed_bpv1(i, args.vq_quality, args.jobs, args.force, args.output)
+        else:
+            search_bpv1(i, args.vq_quality, args.jobs, args.force, args.output)
 
 
 if __name__ == "__main__":
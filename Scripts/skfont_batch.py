@@ -0,0 +1,193 @@
+# This script replaces and exports tiles in SKFONT.CG, SKFONT2.CG, SKFONT3.CG, or SKFONT4.CG
+# without the GUI editor. The tile size is determined from the file size.
+# NumPy and Pillow are required as dependencies.
+#
+# With -m, tiles are replaced according to a manifest file with one replacement per line, in the
+# format PNG file|tile index. The tile index may be hexadecimal with the prefix 0x. PNG file paths
+# are relative to the manifest file. Each PNG file must contain a single row of tiles, as with
+# convert_png_tiles.py, and the first channel (red) is used as pixel data. The tiles starting at
+# the tile index are overwritten with the tiles of the PNG file, in order.
+# The font sheet is written once after all replacements, to a temporary file that then replaces
+# the input file. With -o, the output is written to a separate file instead.
+#
+# With -e START:END, the tiles from START up to but not including END are exported to a PNG file
+# containing a single row of tiles, which can be used for replacement again. -e START exports a
+# single tile. -e can be specified more than once. Exports are made after replacements.
+# PNG files are written to the directory given by -d, or the directory of the font sheet, with the
+# name <font sheet>_<START>_<END>.png.
+
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+from utils import skfont
+
+
+def read_manifest(manifest_file) -> list[tuple[str, int]]:
+    """Read a manifest file and return a list of tuples containing the path
+    to a PNG file and the tile index to replace."""
+
+    manifest_path = os.path.dirname(os.path.abspath(manifest_file))
+    replacements = []
+
+    with open(manifest_file, encoding="utf-8", newline="") as file:
+        for line_num, row in enumerate(csv.reader(file, delimiter="|"), 1):
+            if not row or not "".join(row).strip():
+                continue
+            try:
+                png_file, tile_index = row
+                replacements.append(
+                    (os.path.join(manifest_path, png_file.strip()), int(tile_index, 0))
+                )
+            except ValueError:
+                print(f"{manifest_file}: Line {line_num}: Expected PNG file|tile index: {'|'.join(row)}")
+
+    return replacements
+
+
+def replace_tiles(data: bytearray, size: int, replacements: list[tuple[str, int]]) -> int:
+    """Encode the PNG files in replacements and write the tile data into
+    data at their tile indexes.
+
+    Returns the number of tiles replaced."""
+
+    tile_length = skfont.tile_length(size)
+    tile_count = len(data) // tile_length
+    replaced = 0
+
+    for png_file, tile_index in replacements:
+        try:
+            with Image.open(png_file) as image:
+                tile_data = skfont.encode_tiles(np.asarray(image.getchannel(0)), size)
+        except (OSError, skfont.SKFONTError) as e:
+            print(f"{png_file}: {e}")
+            continue
+
+        count = len(tile_data) // tile_length
+        if not 0 <= tile_index <= tile_count - count:
+            print(
+                f"{png_file}: {count} tiles starting at tile {tile_index} exceed the {tile_count} tiles in the font sheet."
+            )
+            continue
+
+        data[tile_index * tile_length : (tile_index + count) * tile_length] = tile_data
+        replaced += count
+        print(f"{png_file}: Replaced tiles {tile_index} to {tile_index + count - 1}.")
+
+    return replaced
+
+
+def export_tiles(pixels: np.ndarray, start: int, end: int, output_file):
+    """Write tiles start to end - 1 of pixels, as returned by
+    skfont.decode_tiles, to output_file as a PNG file containing a single
+    row of tiles."""
+
+    Image.fromarray(skfont.to_row(pixels[start:end]), "L").convert("RGB").save(output_file, "PNG")
+    print(f"{output_file}: Exported tiles {start} to {end - 1}.")
+
+
+def write_file(filename, data):
+    """Write data to a temporary file in the same directory as filename,
+    then replace filename with it."""
+
+    with tempfile.NamedTemporaryFile(
+        "wb",
+        dir=os.path.dirname(os.path.abspath(filename)),
+        prefix=os.path.basename(filename) + ".",
+        suffix=".tmp",
+        delete=False,
+    ) as file:
+        file.write(data)
+    try:
+        if os.path.exists(filename):
+            shutil.copymode(filename, file.name)
+        os.replace(file.name, filename)
+    except OSError:
+        os.remove(file.name)
+        raise
+
+
+def parse_range(value) -> tuple[int, int]:
+    """Parse a tile range argument in the format START:END or START."""
+
+    start, _, end = value.partition(":")
+    try:
+        start = int(start, 0)
+        end = int(end, 0) if end else start + 1
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid tile range: {value}") from None
+    if not 0 <= start < end:
+        raise argparse.ArgumentTypeError(f"Invalid tile range: {value}")
+
+    return (start, end)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replace and export tiles in SKFONT.CG without the GUI editor."
+    )
+    parser.add_argument("skfont_file", help="SKFONT.CG, SKFONT2.CG, SKFONT3.CG, or SKFONT4.CG.")
+    parser.add_argument(
+        "-m", "--manifest", help="Manifest file with one PNG file|tile index per line."
+    )
+    parser.add_argument(
+        "-e",
+        "--export",
+        action="append",
+        type=parse_range,
+        default=[],
+        metavar="START:END",
+        help="Export tiles START to END - 1 to a PNG file. Can be specified more than once.",
+    )
+    parser.add_argument(
+        "-o", "--output", help="Write the font sheet to this file instead of the input file."
+    )
+    parser.add_argument(
+        "-d", "--output-dir", help="Directory for exported PNG files."
+    )
+    args = parser.parse_args()
+
+    with open(args.skfont_file, "rb") as file:
+        data = bytearray(file.read())
+
+    try:
+        size = skfont.tile_size(len(data))
+    except skfont.SKFONTError as e:
+        print(f"{args.skfont_file}: {e}")
+        return
+
+    if args.manifest:
+        replaced = replace_tiles(data, size, read_manifest(args.manifest))
+        output_file = args.output or args.skfont_file
+        if replaced or args.output:
+            write_file(output_file, data)
+            print(f"{output_file}: Wrote {replaced} replaced tiles.")
+
+    if not args.export:
+        return
+
+    output_dir = args.output_dir or os.path.dirname(os.path.abspath(args.skfont_file))
+    os.makedirs(output_dir, exist_ok=True)
+    pixels = skfont.decode_tiles(data, size)
+    for start, end in args.export:
+        if start >= len(pixels):
+            print(f"Tile range {start}:{end} is outside the font sheet.")
+            continue
+        end = min(end, len(pixels))
+        export_tiles(
+            pixels,
+            start,
+            end,
+            os.path.join(
+                output_dir, f"{os.path.basename(args.skfont_file)}_{start:04}_{end:04}.png"
+            ),
+        )
+
+
+if __name__ == "__main__":
+    main()
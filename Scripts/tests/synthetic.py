@@ -0,0 +1,182 @@
+# Builders for synthetic chunks used by the tests.
+
+import struct
+import zlib
+
+from utils import prs
+from utils.ascr import KNOWN_SIGNATURES
+
+
+def build_ascr(strings: list, subroutines: list, signature=KNOWN_SIGNATURES[0]) -> bytes:
+    """Build an ASCR chunk with the layout expected by read_ascr.
+
+    strings is a list of str. The first string should be empty, and the
+    last strings are used as subroutine names.
+    subroutines is a list of tuples containing four data values and the
+    data bytes, which must end with a 4-byte value ending in 40 40.
+
+    The subroutine table and data are placed after the header, followed by
+    the text offset table and the strings."""
+
+    subroutines_location = 28
+    subroutine_table = bytearray()
+    subroutine_data = bytearray()
+    for *values, data in subroutines:
+        subroutine_table += struct.pack("<4I", *values)
+        subroutine_data += data
+
+    text_location = subroutines_location + len(subroutine_table) + len(subroutine_data)
+    encoded = [i.encode("shift_jis") + b"\x00" for i in strings]
+    text_table = bytearray()
+    offset = len(strings) * 4
+    for i in encoded:
+        text_table += struct.pack("<I", offset)
+        offset += len(i)
+
+    body = (
+        signature
+        + struct.pack(
+            "<4I",
+            text_location - 8,
+            len(strings),
+            subroutines_location - 8,
+            len(subroutines),
+        )
+        + subroutine_table
+        + subroutine_data
+        + text_table
+        + b"".join(encoded)
+    )
+
+    if (padding := len(body) % 4) != 0:
+        body += b"\x40" * (4 - padding)
+
+    return b"ASCR" + struct.pack("<I", len(body)) + body + b"EOFC\x00\x00\x00\x00"
+
+
+def sample_ascr(string_count=10, subroutine_count=4) -> bytes:
+    """Build an ASCR chunk with string_count dialogue strings and
+    subroutine_count subroutine entries."""
+
+    names = [f"sub_{i:04d}" for i in range(subroutine_count)]
+    dialogue = [
+        f"Line {i}: Lorem ipsum dolor sit amet, consectetur adipiscing elit."
+        for i in range(string_count)
+    ]
+    subroutines = [
+        (i, i * 2, 0, 1, bytes((i % 256, 0, 1, 0)) * (i % 5) + b"\x00\x00\x40\x40")
+        for i in range(subroutine_count)
+    ]
+
+    return build_ascr([""] + dialogue + names, subroutines)
+
+
+def sample_translation(rows: list) -> list:
+    """Replace the text of the dialogue rows from read_ascr with English
+    text of varying length that fits in 3 rows."""
+
+    sentences = [
+        "Hello, Erica!",
+        "The weather is nice today, isn't it?",
+        "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod labore.",
+        "{W1}Ogami: \"Wait!\" // I'll be right there.",
+    ]
+
+    return [
+        [offset, entry_type, sentences[i % len(sentences)]]
+        if entry_type == "dialogue"
+        else [offset, entry_type, text]
+        for i, (offset, entry_type, text) in enumerate(rows)
+    ]
+
+
+def build_bpv1(textures: list) -> bytes:
+    """Build a BPV1 chunk with the layout expected by bpv1.read_bpv1.
+
+    textures is a list of tuples containing the pixel format, data format,
+    width, height, and texture data of each texture."""
+
+    count = len(textures)
+    groups = bytearray()
+    entries = bytearray()
+    texture_data = bytearray()
+    # Offsets are relative to the position 8 bytes into the chunk.
+    offset = 8 + count * 56
+    for i, (pixel_format, data_format, width, height, data) in enumerate(textures):
+        groups += struct.pack("<3I", 8 + count * 12 + i * 44, 0, 0)
+        entries += struct.pack(
+            "<IHBB9I", offset, 0, pixel_format, data_format, 0, 0, width, height, *[0] * 5
+        )
+        texture_data += data
+        offset += len(data)
+
+    body = struct.pack("<II", 8, count) + groups + entries + texture_data
+
+    return b"BPV1" + struct.pack("<I", len(body)) + body + b"EOFC\x00\x00\x00\x00"
+
+
+def build_adcg(
+    pixel_format: int,
+    data_format: int,
+    texture_size: int,
+    total_width: int,
+    total_height: int,
+    subtextures: list,
+) -> bytes:
+    """Build an uncompressed ADCG chunk with the layout expected by
+    adcg.read_adcg.
+
+    subtextures is a list of tuples containing the X and Y coordinates and
+    the texture data of each subtexture."""
+
+    table = bytearray()
+    texture_data = bytearray()
+    for i, (x, y, data) in enumerate(subtextures):
+        # Offsets are relative to the position 32 bytes after the table entry.
+        offset = len(subtextures) * 16 + len(texture_data) - 16 * i
+        table += struct.pack("<IIHH4s", i, offset, x, y, b"\x00" * 4)
+        texture_data += data
+
+    body = (
+        b"\x00\x00\x00\x01"
+        + struct.pack("<IHH", len(subtextures), texture_size, texture_size)
+        + b"\x18\x00\x00\x00"
+        + struct.pack("<BBHHH", pixel_format, data_format, 0, total_width, total_height)
+        + table
+        + texture_data
+    )
+
+    return b"ADCG" + struct.pack("<I", len(body)) + body
+
+
+def fake_prs_compress(data) -> bytes:
+    """Compress data with the wrapping added by prs.compress, using zlib
+    instead of PRS, which requires external programs."""
+
+    compressed = zlib.compress(bytes(data[8:]), 9)
+    padding = -len(compressed) % 4
+
+    return (
+        bytes(data[0:4])
+        + struct.pack("<III", len(compressed) + padding + 8, len(data) - 8, len(compressed))
+        + compressed
+        + b"\x00" * padding
+        + b"CPRS\x00\x00\x00\x00EOFC\x00\x00\x00\x00"
+    )
+
+
+def fake_prs_decompress(data) -> bytes:
+    """Decompress data returned by fake_prs_compress, with the same checks
+    as prs.decompress."""
+
+    padded_length, uncompressed_length, compressed_length = struct.unpack_from("<III", data, 4)
+    if len(data) - 24 != padded_length:
+        raise prs.PRSError(
+            f"Padded data length in header is incorrect (Expected {padded_length}, got {len(data) - 24})"
+        )
+
+    return (
+        bytes(data[0:4])
+        + struct.pack("<I", uncompressed_length)
+        + zlib.decompress(bytes(data[16 : 16 + compressed_length]))
+    )
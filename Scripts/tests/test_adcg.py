@@ -0,0 +1,187 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import encode_adcg
+from tests.synthetic import build_adcg, fake_prs_compress
+from utils import adcg, pvr
+
+
+def test_weave():
+    rng = np.random.default_rng(0)
+    tiles = [rng.integers(0, 256, (16, 16, 4), dtype=np.uint8) for _ in range(4)]
+    # The last subtexture extends past the edge of the image.
+    coordinates = [(0, 0), (16, 0), (0, 16), (16, 16)]
+    chunk = build_adcg(
+        2,
+        0x1,
+        16,
+        24,
+        24,
+        [
+            (x, y, pvr.encode_texture(tile, 2, 0x1))
+            for (x, y), tile in zip(coordinates, tiles)
+        ],
+    )
+
+    header = adcg.read_adcg(chunk)
+    assert (header.pixel_format, header.data_format) == (2, 0x1)
+    assert [(i.x, i.y) for i in header.subtextures] == coordinates
+
+    # Compare with subtextures pasted with Pillow.
+    expected = Image.new("RGBA", (24, 24))
+    for (x, y), tile in zip(coordinates, tiles):
+        quantized = pvr.decode_pixels(pvr.encode_pixels(tile, 2), 2)
+        expected.paste(Image.fromarray(quantized, "RGBA"), (x, y))
+
+    assert (adcg.weave(chunk) == np.asarray(expected)).all()
+
+
+def test_encode_tiles():
+    rng = np.random.default_rng(0)
+    # Subtextures in the right column extend past the edge of the image.
+    subtextures = [
+        (x, y, pvr.encode_texture(rng.integers(0, 256, (16, 16, 4), dtype=np.uint8), 0, 0x1))
+        for y in (0, 16)
+        for x in (0, 16, 32)
+    ]
+    chunk = build_adcg(0, 0x1, 16, 40, 24, subtextures)
+    header = adcg.read_adcg(chunk)
+
+    # Encoding the woven image reproduces the subtextures within the image.
+    texture_data, unique_tiles = encode_adcg.encode_tiles(header, chunk, adcg.weave(chunk))
+    assert unique_tiles == 6
+    assert len(header.header) + len(texture_data) == len(chunk)
+    assert (adcg.weave(header.header + texture_data) == adcg.weave(chunk)).all()
+    assert texture_data[:512] == chunk[len(header.header) : len(header.header) + 512]
+
+    # Identical subtextures are encoded once and share the same data.
+    tile = pvr.encode_texture(np.zeros((16, 16, 4), dtype=np.uint8), 0, 0x1)
+    chunk = build_adcg(0, 0x1, 16, 32, 16, [(0, 0, tile), (16, 0, tile)])
+    texture_data, unique_tiles = encode_adcg.encode_tiles(
+        adcg.read_adcg(chunk), chunk, np.zeros((16, 32, 4), dtype=np.uint8)
+    )
+    assert unique_tiles == 1
+    assert texture_data == tile * 2
+
+
+def test_find_adcg_files(tmp_path):
+    tile = pvr.encode_texture(np.zeros((16, 16, 4), dtype=np.uint8), 0, 0x1)
+    chunk = build_adcg(0, 0x1, 16, 16, 16, [(0, 0, tile)])
+    archive = str(tmp_path / "archive.bin")
+    for index, offset in ((1, 0x40), (0, 0x2000)):
+        with open(f"{archive}_{index:04}_{hex(offset)}.adcg", "wb") as f:
+            f.write(chunk)
+        pvr.to_image(adcg.weave(chunk)).save(f"{archive}_{index:04}_{hex(offset)}.png")
+    # ADCG files without a matching PNG file are ignored.
+    with open(f"{archive}_0002_0x4000.adcg", "wb") as f:
+        f.write(chunk)
+
+    adcg_files = encode_adcg.find_adcg_files(archive)
+    assert [i[0] for i in adcg_files] == [0x40, 0x2000]
+    assert encode_adcg.is_unchanged(*adcg_files[0][1:])
+
+    image = Image.open(adcg_files[0][2])
+    image.putpixel((0, 0), (255, 0, 0, 255))
+    image.save(adcg_files[0][2])
+    assert not encode_adcg.is_unchanged(*adcg_files[0][1:])
+
+
+def test_encode_batch_chunk(tmp_path, monkeypatch, capsys):
+    # PRS compression requires an external program, so the chunk is stored uncompressed.
+    monkeypatch.setattr(encode_adcg.prs, "compress", bytes)
+    tile = pvr.encode_texture(np.zeros((16, 16, 4), dtype=np.uint8), 0, 0x1)
+    chunk = build_adcg(0, 0x1, 16, 16, 16, [(0, 0, tile)])
+    input_adcg = str(tmp_path / "archive.bin_0000_0x40.adcg")
+    input_png = str(tmp_path / "archive.bin_0000_0x40.png")
+    with open(input_adcg, "wb") as f:
+        f.write(chunk)
+    pvr.to_image(adcg.weave(chunk)).save(input_png)
+
+    assert encode_adcg.encode_batch_chunk(input_adcg, input_png) == ("unchanged", None, [])
+
+    # Messages are returned to the parent process, and no files are written.
+    status, output_data, messages = encode_adcg.encode_batch_chunk(input_adcg, input_png, False)
+    assert status == "encoded" and output_data == chunk
+    assert messages == [f"{input_png}: Encoded 1 unique tiles out of 1 (0% duplicates)."]
+    assert capsys.readouterr().out == ""
+    assert sorted(os.listdir(tmp_path)) == sorted(map(os.path.basename, (input_adcg, input_png)))
+
+
+def test_encode_batch(tmp_path, monkeypatch, capsys):
+    # PRS is replaced by zlib, and worker processes by threads, so that the replacement applies
+    # to the workers.
+    monkeypatch.setattr(encode_adcg.prs, "compress", fake_prs_compress)
+    monkeypatch.setattr(encode_adcg, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    rng = np.random.default_rng(0)
+    noise = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    blank = np.zeros((16, 16, 4), dtype=np.uint8)
+
+    def compressed_chunk(pixels):
+        chunk = build_adcg(0, 0x1, 16, 16, 16, [(0, 0, pvr.encode_texture(pixels, 0, 0x1))])
+        return chunk, fake_prs_compress(chunk)
+
+    # An archive with a chunk that compresses badly, a chunk that compresses well, and other data
+    # after each chunk.
+    archive = str(tmp_path / "archive.bin")
+    offsets = []
+    data = bytearray()
+    for index, pixels in enumerate((noise, blank)):
+        chunk, compressed = compressed_chunk(pixels)
+        offsets.append(len(data))
+        data += compressed + b"\xff" * 16
+        basename = f"{archive}_{index:04}_{hex(offsets[-1])}"
+        with open(basename + ".adcg", "wb") as f:
+            f.write(chunk)
+        pvr.to_image(adcg.weave(chunk)).save(basename + ".png")
+    with open(archive, "wb") as f:
+        f.write(data)
+    original = bytes(data)
+    noise_length = len(compressed_chunk(noise)[1])
+    blank_length = len(compressed_chunk(blank)[1])
+
+    report = encode_adcg.encode_batch(archive)
+    assert [i["status"] for i in report] == ["unchanged", "unchanged"]
+
+    # The first chunk now fits with room to spare, and the second one overflows.
+    pvr.to_image(blank).save(f"{archive}_0000_0x0.png")
+    pvr.to_image(noise).save(f"{archive}_0001_{hex(offsets[1])}.png")
+    report = encode_adcg.encode_batch(archive, patch=True)
+    assert report == [
+        {
+            "file": "archive.bin_0000_0x0.adcg",
+            "offset": "0x0",
+            "slot_length": noise_length,
+            "length": blank_length,
+            "headroom": noise_length - blank_length,
+            "status": "fits",
+        },
+        {
+            "file": f"archive.bin_0001_{hex(offsets[1])}.adcg",
+            "offset": hex(offsets[1]),
+            "slot_length": blank_length,
+            "length": noise_length,
+            "headroom": blank_length - noise_length,
+            "status": "overflow",
+        },
+    ]
+    assert "Patched 1 ADCG chunks." in capsys.readouterr().out
+
+    # With -p, the chunk that fits is written and the remaining space is filled with byte 00.
+    # The chunk that overflows is left unchanged.
+    with open(archive, "rb") as f:
+        data = f.read()
+    assert data[:blank_length] == compressed_chunk(blank)[1]
+    assert data[blank_length:noise_length] == b"\x00" * (noise_length - blank_length)
+    assert data[noise_length:] == original[noise_length:]
+
+    # On a later run, the space of the patched chunk still includes the zero fill.
+    pvr.to_image(noise).save(f"{archive}_0000_0x0.png")
+    report = encode_adcg.encode_batch(archive, patch=True)
+    assert report[0]["slot_length"] == noise_length
+    assert report[0]["status"] == "fits" and report[0]["headroom"] == 0
+    with open(archive, "rb") as f:
+        assert f.read() == original
@@ -1,19 +1,102 @@
+from io import BytesIO
+
+import pytest
+
+import validate_ascr
+from tests.synthetic import sample_ascr
 from utils import ascr
 
 
 def test_linebreak():
     # Test line breaking.
     test_string1 = "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod labore et dolor magna aliqua."
-    assert ascr.linebreak(test_string1) == (
-        r"Lorem ipsum dolor sit amet,\consectetur adipiscing elit, sed do\eiusmod labore et dolor magna aliqua.",
+    assert ascr._linebreak(test_string1) == (
+        r"Lorem ipsum dolor sit amet,\consectetur adipiscing elit, sed do\eiusmod labore et dolor magna aliqua. ",
         3,
         0,
     )
 
     # Test a forced line break, which will cause overflow and generate 1 warning.
     test_string2 = r"Lorem ipsum//dolor sit amet, consectetur adipiscing elit, sed do eiusmod labore et dolor magna aliqua."
-    assert ascr.linebreak(test_string2) == (
-        r"Lorem ipsum\dolor sit amet, consectetur\adipiscing elit, sed do eiusmod\labore et dolor magna aliqua.",
+    assert ascr._linebreak(test_string2) == (
+        r"Lorem ipsum\dolor sit amet, consectetur\adipiscing elit, sed do eiusmod labore\et dolor magna aliqua. ",
         4,
         1,
     )
+
+
+def test_ascr_chunk_rows():
+    # The compact model produces the same rows as read_ascr and round-trips
+    # through the CSV layout.
+    data = sample_ascr(20, 8)
+    rows = ascr.read_ascr(BytesIO(data))
+    chunk = ascr.AscrChunk.from_bytes(data)
+
+    assert chunk.to_rows() == rows
+    assert len(chunk) == 29
+    assert chunk.subroutines_count == 8
+    assert chunk.subroutine_name(0) == "sub_0000"
+    assert bytes(chunk.subroutine_data[0]) == b"\x00\x00\x40\x40"
+
+    restored = ascr.AscrChunk.from_rows(*rows)
+    assert restored.to_rows() == rows
+    assert restored.text_location == chunk.text_location
+    assert restored.subroutines_location == chunk.subroutines_location
+
+
+def test_write_ascr_chunk():
+    # write_ascr accepts an AscrChunk in place of CSV rows.
+    data = sample_ascr(5, 2)
+    chunk = ascr.AscrChunk.from_bytes(data)
+
+    assert ascr.write_ascr(BytesIO(data), chunk) == ascr.write_ascr(
+        BytesIO(data), chunk.text_rows()
+    )
+
+
+def test_validate_strings():
+    # Overflows and invalid characters are reported without printing warnings.
+    strings = [
+        ["0x10", "code", ""],
+        ["0x11", "dialogue", "Lorem ipsum dolor sit amet."],
+        ["0x2d", "dialogue", " ".join(["Lorem ipsum dolor sit amet."] * 6)],
+        ["0x60", "dialogue", "Lorem_ipsum"],
+        ["0x70", "unknown", "ロレム"],
+        ["0x80", "dialogue"],
+    ]
+    issues = ascr.validate_strings(strings, filename="test.csv")
+
+    assert [(i.line_id, i.kind) for i in issues] == [
+        (3, "line_break"),
+        (4, "invalid_character"),
+        (5, "entry_type"),
+        (6, "row"),
+    ]
+    assert issues[0].rows == 5
+    assert issues[1].invalid_characters == ["_"]
+
+
+def test_validate_control_codes():
+    # A control code without a closing } is reported, since ascii_to_sjis cannot convert it.
+    strings = [
+        ["0x1", "dialogue", "Hello {W1 there"],
+        ["0x2", "dialogue", "Hello {W1} there"],
+        ["0x3", "dialogue", "Hello {"],
+    ]
+    issues = ascr.validate_strings(strings)
+
+    assert [(i.line_id, i.kind) for i in issues] == [(1, "control_code"), (3, "control_code")]
+    with pytest.raises(IndexError):
+        ascr.ascii_to_sjis(strings[0][2])
+
+
+def test_validate_file(tmp_path):
+    # Files that cannot be read are reported as issues instead of raising.
+    (tmp_path / "good.sbn.csv").write_text("0x11|dialogue|Lorem ipsum.\n", encoding="utf-8")
+    (tmp_path / "bad.sbn.csv").write_bytes("0x11|dialogue|ロレム\n".encode("shift_jis"))
+
+    assert validate_ascr.validate_file(str(tmp_path / "good.sbn.csv")) == (1, [])
+    for filename in ("bad.sbn.csv", "missing.sbn.csv"):
+        rows, issues = validate_ascr.validate_file(str(tmp_path / filename))
+        assert rows == 0
+        assert [(i["file"], i["kind"]) for i in issues] == [(str(tmp_path / filename), "file")]
@@ -0,0 +1,87 @@
+# Benchmarks for the ASCR text pipeline, using synthetic chunks.
+# pytest-benchmark is required; these tests are skipped if it is not installed.
+#
+# To record a baseline, run from the Scripts directory:
+#   python -m pytest tests/test_ascr_benchmark.py --benchmark-autosave
+# To compare against the last saved baseline and fail on a regression of more than 10%:
+#   python -m pytest tests/test_ascr_benchmark.py --benchmark-compare --benchmark-compare-fail=mean:10%
+# To skip the benchmarks and only run the round-trip checks:
+#   python -m pytest tests/test_ascr_benchmark.py --benchmark-disable
+
+import struct
+from io import BytesIO
+
+import pytest
+
+from tests.synthetic import sample_ascr, sample_translation
+from utils import ascr
+
+pytest.importorskip("pytest_benchmark")
+
+# String counts and subroutine counts of the synthetic chunks.
+SIZES = [(10, 4), (1000, 500), (10000, 4000)]
+
+LONG_STRING = "{W1}Ogami: Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod labore et dolor magna aliqua."
+
+
+@pytest.fixture(scope="module", params=SIZES, ids=lambda i: f"{i[0]}strings")
+def chunk(request):
+    return sample_ascr(*request.param)
+
+
+def test_read_ascr(benchmark, chunk, capsys):
+    text_rows, subroutine_rows = benchmark(ascr.read_ascr, BytesIO(chunk))
+    capsys.readouterr()
+
+    # Rows convert back to an identical model.
+    assert ascr.AscrChunk.from_rows(text_rows, subroutine_rows).to_rows() == (
+        text_rows,
+        subroutine_rows,
+    )
+
+
+def test_chunk_from_bytes(benchmark, chunk):
+    parsed = benchmark(ascr.AscrChunk.from_bytes, chunk)
+
+    assert parsed.to_rows() == ascr.AscrChunk.from_bytes(chunk).to_rows()
+
+
+def test_write_ascr(benchmark, chunk, capsys):
+    text_rows, _ = ascr.read_ascr(BytesIO(chunk))
+    translation = sample_translation(text_rows)
+
+    new_chunk, warnings = benchmark(
+        lambda: ascr.write_ascr(BytesIO(chunk), translation)
+    )
+    capsys.readouterr()
+    assert warnings == 0
+
+    # Data between the header and the text offset table is retained, and
+    # each string is encoded by ascii_to_sjis. Translated strings use tiles
+    # that are not valid Shift-JIS, so they are compared as bytes.
+    text_location = struct.unpack_from("<I", chunk, 12)[0] + 8
+    assert new_chunk[8:text_location] == chunk[8:text_location]
+
+    offsets = struct.unpack_from(f"<{len(translation)}I", new_chunk, text_location)
+    for offset, (_, entry_type, text) in zip(offsets, translation):
+        start = text_location + offset
+        if entry_type == "dialogue":
+            expected = ascr.ascii_to_sjis(text)[0]
+        else:
+            expected = text.encode("shift_jis") + b"\x00"
+        assert new_chunk[start : start + len(expected)] == expected
+
+
+def test_ascii_to_sjis(benchmark):
+    encoded, warnings = benchmark(ascr.ascii_to_sjis, LONG_STRING)
+
+    assert warnings == 0
+    assert encoded.endswith(b"\x00")
+    assert encoded.count(b"\x2f\x2f") == 2
+
+
+def test_linebreak(benchmark):
+    output, rows, warnings = benchmark(ascr._linebreak, LONG_STRING)
+
+    assert (rows, warnings) == (3, 0)
+    assert output.count("\\") == 2
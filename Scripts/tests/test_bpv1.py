@@ -0,0 +1,36 @@
+import pytest
+
+from tests.synthetic import build_bpv1
+from utils import bpv1
+
+
+def test_read_bpv1():
+    textures = [(2, 0x1, 8, 8, b"\x01" * 128), (1, 0x9, 16, 4, b"\x02" * 130)]
+    chunk = b"\x00" * 16 + build_bpv1(textures)
+
+    table = bpv1.read_bpv1(chunk, 16)
+    assert len(table.groups) == len(table.textures) == 2
+    assert table.tables == chunk[32 : 32 + 2 * 56]
+
+    for i, (pixel_format, data_format, width, height, data) in enumerate(textures):
+        texture = table.textures[i]
+        assert (texture.pixel_format, texture.data_format) == (pixel_format, data_format)
+        assert (texture.width, texture.height) == (width, height)
+        start, end = table.texture_range(i)
+        assert chunk[16 + start : 16 + end] == data
+
+    with pytest.raises(bpv1.BPV1Error):
+        bpv1.read_bpv1(chunk, 0)
+
+
+def test_read_bpv1_group_order():
+    # Chunks whose groups do not point to the texture entries in order are
+    # still parsed, with a warning.
+    chunk = bytearray(build_bpv1([(1, 0x1, 8, 8, b"\x01" * 128), (1, 0x1, 8, 8, b"\x02" * 128)]))
+    chunk[16:28], chunk[28:40] = chunk[28:40], chunk[16:28]
+
+    warnings = []
+    table = bpv1.read_bpv1(chunk, 0, warnings)
+    assert len(warnings) == 2
+    assert [table.texture_range(i) for i in range(2)] == [(128, 256), (256, 384)]
+    assert bpv1.read_bpv1(chunk).textures == table.textures
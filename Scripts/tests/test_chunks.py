@@ -0,0 +1,83 @@
+import hashlib
+import json
+import struct
+
+from utils import chunks
+
+
+def test_scan_chunks():
+    # Only signatures at 4-byte alignment are found, sorted by offset.
+    data = bytearray(64)
+    data[0:4] = b"BPV1"
+    data[13:17] = b"ADCG"  # Not aligned.
+    data[20:24] = b"ADCG"
+    data[32:36] = b"CPRS"
+    data[40:44] = b"EOFC"
+    data[60:64] = b"EOFC"
+
+    index = chunks.scan_chunks(data)
+    assert index == [
+        (0, b"BPV1"),
+        (20, b"ADCG"),
+        (32, b"CPRS"),
+        (40, b"EOFC"),
+        (60, b"EOFC"),
+    ]
+    assert chunks.scan_chunks(data, (b"ADCG",), start=4, end=32) == [(20, b"ADCG")]
+    assert chunks.filter_chunks(index, b"EOFC") == [(40, b"EOFC"), (60, b"EOFC")]
+
+    assert chunks.find_next(index, 20, b"EOFC") == 40
+    assert chunks.find_next(index, 40, b"EOFC") == 60
+    assert chunks.find_next(index, 60, b"EOFC") == -1
+
+
+def test_load_index(tmp_path):
+    # A compressed chunk ends after its EOFC footer. An uncompressed chunk
+    # uses the size in its header.
+    compressed = b"ADCG" + struct.pack("<III", 16, 100, 8) + bytes(8)
+    compressed += b"CPRS\x00\x00\x00\x00EOFC\x00\x00\x00\x00"
+    uncompressed = b"BPV1" + struct.pack("<I", 8) + bytes(8) + b"EOFC\x00\x00\x00\x00"
+    data = bytes(8) + compressed + uncompressed + bytes(4)
+
+    container = tmp_path / "container.bin"
+    container.write_bytes(data)
+
+    index = chunks.load_index(str(container))
+    assert [i[:4] for i in index] == [(8, b"ADCG", 40, 100), (48, b"BPV1", 24, 24)]
+    assert index[0].sha1 == hashlib.sha1(compressed).hexdigest()
+
+    # The sidecar file is reused while the container is unchanged.
+    sidecar = tmp_path / ("container.bin" + chunks.INDEX_EXTENSION)
+    saved = json.loads(sidecar.read_text())
+    saved["chunks"] = saved["chunks"][:1]
+    sidecar.write_text(json.dumps(saved))
+    assert chunks.load_index(str(container)) == index[:1]
+
+    # A change in size causes a rescan.
+    container.write_bytes(data + bytes(4))
+    assert chunks.load_index(str(container)) == index
+
+
+def test_load_index_signature_in_compressed_data(tmp_path):
+    # Signatures inside compressed data do not end the chunk or start a new one.
+    compressed = b"ADCG" + struct.pack("<III", 24, 100, 16) + b"BPV1CPRS" + bytes(8)
+    compressed += b"CPRS\x00\x00\x00\x00EOFC\x00\x00\x00\x00"
+    container = tmp_path / "container.bin"
+    container.write_bytes(compressed + bytes(4))
+
+    index = chunks.load_index(str(container))
+    assert [i[:4] for i in index] == [(0, b"ADCG", 48, 100)]
+
+
+def test_load_slots(tmp_path):
+    footers = b"CPRS\x00\x00\x00\x00EOFC\x00\x00\x00\x00"
+    container = tmp_path / "container.bin"
+    container.write_bytes(b"ADCG" + struct.pack("<III", 24, 100, 16) + bytes(16) + footers)
+    index = chunks.load_index(str(container))
+    assert chunks.load_slots(str(container), index) == {0: 48}
+
+    # The space of a chunk replaced by a shorter one is still its original length.
+    container.write_bytes(b"ADCG" + struct.pack("<III", 16, 100, 8) + bytes(8) + footers + bytes(8))
+    index = chunks.load_index(str(container), rebuild=True)
+    assert index[0].compressed_length == 40
+    assert chunks.load_slots(str(container), index) == {0: 48}
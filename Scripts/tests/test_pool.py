@@ -0,0 +1,26 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from utils import pool
+
+
+def test_imap_unordered():
+    # Tasks are read from the generator only as results are consumed.
+    consumed = []
+    release = threading.Event()
+
+    def tasks():
+        for i in range(10):
+            consumed.append(i)
+            yield (i,)
+
+    def square(i):
+        release.wait()
+        return i * i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = pool.imap_unordered(executor, square, tasks(), 4)
+        release.set()
+        first = next(results)
+        assert len(consumed) <= 5
+        assert sorted([first] + list(results)) == [i * i for i in range(10)]
@@ -0,0 +1,49 @@
+import numpy as np
+
+from tests.test_twiddle import morton
+from utils import pvr
+
+
+def test_decode_texture():
+    # ARGB4444, square twiddled.
+    values = np.arange(64, dtype="<u2") * 0x0421
+    pixels = pvr.decode_texture(values.tobytes(), 2, 0x1, 8, 8)
+    value = int(values[morton(3, 5)])
+    assert pixels.shape == (8, 8, 4)
+    assert list(pixels[5, 3]) == [
+        ((value >> shift) & 0xF) * 17 for shift in (8, 4, 0, 12)
+    ]
+
+    # RGB565, VQ. Each index selects a 2x2 block from the codebook.
+    codebook = np.arange(1024, dtype="<u2").reshape(256, 4)
+    indices = np.arange(16, dtype=np.uint8)[::-1]
+    pixels = pvr.decode_texture(
+        codebook.tobytes() + indices.tobytes(), 1, 0x3, 8, 8
+    )
+    expected = pvr.decode_pixels(
+        codebook[indices[morton(2, 1)], (1 << 1) | 0], 1
+    )
+    assert list(pixels[2, 5]) == list(expected)
+
+    assert pvr.texture_length(0x2, 64, 64) == 2 + 2 * (1 + 4 + 16 + 64 + 256 + 1024) + 8192
+
+
+def test_encode_texture():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+
+    for pixel_format in pvr.PIXEL_FORMATS:
+        # Twiddled data decodes to the pixels quantized to the pixel format.
+        quantized = pvr.decode_pixels(pvr.encode_pixels(pixels, pixel_format), pixel_format)
+        for data_format in (0x1, 0x2, 0x12):
+            data = pvr.encode_texture(pixels, pixel_format, data_format)
+            assert len(data) == pvr.texture_length(data_format, 16, 16)
+            assert (pvr.decode_texture(data, pixel_format, data_format, 16, 16) == quantized).all()
+
+        # VQ textures with few distinct blocks are encoded without loss.
+        blocks = quantized[:2].reshape(2, 8, 2, 4).swapaxes(0, 1)
+        choices = rng.integers(0, 8, (8, 8))
+        image = blocks[choices].swapaxes(1, 2).reshape(16, 16, 4)
+        data = pvr.encode_texture(image, pixel_format, 0x10)
+        assert len(data) == pvr.texture_length(0x10, 16, 16)
+        assert (pvr.decode_texture(data, pixel_format, 0x10, 16, 16) == image).all()
@@ -0,0 +1,198 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import extract_bpv1
+import repack_bpv1
+from tests.synthetic import build_bpv1, fake_prs_compress, fake_prs_decompress
+from utils import prs, pvr
+
+
+def extract_sample(tmp_path):
+    """Write a file containing a BPV1 chunk with a twiddled texture and a
+    VQ texture, and extract it."""
+
+    rng = np.random.default_rng(0)
+    textures = [
+        (2, 0x1, 8, 8, rng.integers(0, 256, (8, 8, 4), dtype=np.uint8)),
+        (1, 0x3, 16, 16, rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)),
+    ]
+    chunk = build_bpv1(
+        [(*i[:4], pvr.encode_texture(i[4], i[0], i[1])) for i in textures]
+    )
+
+    bpv1_file = str(tmp_path / "sample.bin")
+    with open(bpv1_file, "wb") as f:
+        f.write(b"\x00" * 16 + chunk)
+
+    extract_bpv1.quiet = True
+    extract_bpv1.search_bpv1(bpv1_file)
+
+    return bpv1_file
+
+
+def test_repack_incremental(tmp_path, capsys):
+    bpv1_file = extract_sample(tmp_path)
+
+    repack_bpv1.search_bpv1(bpv1_file)
+    assert "Repacked 2 out of 2" in capsys.readouterr().out
+
+    # Nothing is encoded when no PNG file has changed.
+    with open(bpv1_file, "rb") as f:
+        original = f.read()
+    repack_bpv1.search_bpv1(bpv1_file)
+    assert "Repacked 0 out of 2 textures into" in capsys.readouterr().out
+
+    # Only the edited texture is encoded.
+    pixels = np.full((8, 8, 4), 255, dtype=np.uint8)
+    Image.fromarray(pixels, "RGBA").save(bpv1_file + "_0x10_000.png")
+    repack_bpv1.search_bpv1(bpv1_file)
+    output = capsys.readouterr().out
+    assert "Repacked 1 out of 2" in output and "1 textures were unchanged" in output
+
+    with open(bpv1_file, "rb") as f:
+        data = f.read()
+    start = 16 + 16 + 2 * 56
+    assert data[start : start + 128] == pvr.encode_texture(pixels, 2, 0x1)
+    assert data[start + 128 :] == original[start + 128 :]
+
+
+def test_repack_output_file(tmp_path, capsys):
+    bpv1_file = extract_sample(tmp_path)
+    with open(bpv1_file, "rb") as f:
+        original = f.read()
+
+    pixels = np.full((8, 8, 4), 255, dtype=np.uint8)
+    Image.fromarray(pixels, "RGBA").save(bpv1_file + "_0x10_000.png")
+    output_file = str(tmp_path / "output.bin")
+    repack_bpv1.search_bpv1(bpv1_file, output_file=output_file)
+    assert "Repacked 2 out of 2" in capsys.readouterr().out
+
+    # The input file is unchanged, and the copy contains the edited texture.
+    with open(bpv1_file, "rb") as f:
+        assert f.read() == original
+    with open(output_file, "rb") as f:
+        data = f.read()
+    start = 16 + 16 + 2 * 56
+    assert len(data) == len(original)
+    assert data[:start] == original[:start]
+    assert data[start : start + 128] == pvr.encode_texture(pixels, 2, 0x1)
+
+    # The manifest is saved next to the output file, and a second run reuses the earlier output.
+    repack_bpv1.search_bpv1(bpv1_file, output_file=output_file)
+    assert "Repacked 0 out of 2 textures into" in capsys.readouterr().out
+    with open(output_file, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(output_file + repack_bpv1.PREVIOUS_EXTENSION)
+
+
+def test_repack_output_file_input_manifest(tmp_path, capsys):
+    bpv1_file = extract_sample(tmp_path)
+    repack_bpv1.search_bpv1(bpv1_file)
+    capsys.readouterr()
+
+    # The manifest of the input file applies to the copy.
+    output_file = str(tmp_path / "output.bin")
+    repack_bpv1.search_bpv1(bpv1_file, output_file=output_file)
+    assert "Repacked 0 out of 2 textures into" in capsys.readouterr().out
+    assert os.path.isfile(output_file + repack_bpv1.MANIFEST_EXTENSION)
+
+
+def test_repack_patches_textures(tmp_path, monkeypatch):
+    bpv1_file = extract_sample(tmp_path)
+    repack_bpv1.search_bpv1(bpv1_file)
+
+    writes = []
+    patch = repack_bpv1.patch
+
+    def record_patch(mm, offset, data):
+        writes.append((offset, offset + len(data)))
+        return patch(mm, offset, data)
+
+    monkeypatch.setattr(repack_bpv1, "patch", record_patch)
+
+    # Only the range of the edited texture is written.
+    pixels = np.full((8, 8, 4), 255, dtype=np.uint8)
+    Image.fromarray(pixels, "RGBA").save(bpv1_file + "_0x10_000.png")
+    repack_bpv1.search_bpv1(bpv1_file)
+    start = 16 + 16 + 2 * 56
+    assert writes == [(start, start + 128)]
+
+
+def extract_compressed_sample(tmp_path, monkeypatch, pixels):
+    """Write a file containing a PRS-compressed BPV1 chunk with a single
+    texture followed by 16 bytes of other data, and extract it. PRS is
+    replaced by zlib, and worker processes by threads, so that the
+    replacement applies to the workers."""
+
+    monkeypatch.setattr(prs, "compress", fake_prs_compress)
+    monkeypatch.setattr(prs, "decompress", fake_prs_decompress)
+    monkeypatch.setattr(repack_bpv1, "ProcessPoolExecutor", ThreadPoolExecutor)
+
+    chunk = build_bpv1([(1, 0x1, 16, 16, pvr.encode_texture(pixels, 1, 0x1))])
+    bpv1_file = str(tmp_path / "sample.bin")
+    with open(bpv1_file, "wb") as f:
+        f.write(b"\x00" * 16 + fake_prs_compress(chunk[:-8]) + b"\xff" * 16)
+
+    extract_bpv1.quiet = True
+    extract_bpv1.decompress_bpv1(bpv1_file)
+
+    return bpv1_file
+
+
+def test_repack_compressed(tmp_path, monkeypatch, capsys):
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    bpv1_file = extract_compressed_sample(tmp_path, monkeypatch, pixels)
+    png_file = bpv1_file + "_0x10_000.png"
+    with open(bpv1_file, "rb") as f:
+        original = f.read()
+    slot_length = len(original) - 32
+    capsys.readouterr()
+
+    # A texture that compresses better fits, and the rest of the space is filled with byte 00.
+    blank = np.zeros((16, 16, 4), dtype=np.uint8)
+    Image.fromarray(blank, "RGBA").save(png_file)
+    repack_bpv1.search_compressed_bpv1(bpv1_file)
+    output = capsys.readouterr().out
+    assert "Repacked 1 out of 1" in output
+    with open(bpv1_file, "rb") as f:
+        data = f.read()
+    chunk = build_bpv1([(1, 0x1, 16, 16, pvr.encode_texture(blank, 1, 0x1))])
+    compressed = fake_prs_compress(chunk[:-8])
+    assert f"{slot_length - len(compressed)} bytes free" in output
+    assert data[16 : 16 + len(compressed)] == compressed
+    assert data[16 + len(compressed) :] == b"\x00" * (slot_length - len(compressed)) + b"\xff" * 16
+
+    # On a second run in place, the space still includes the zero fill, so the original texture
+    # fits again.
+    Image.fromarray(pixels, "RGBA").save(png_file)
+    repack_bpv1.search_compressed_bpv1(bpv1_file)
+    assert "Repacked 1 out of 1" in capsys.readouterr().out
+    with open(bpv1_file, "rb") as f:
+        assert f.read() == original
+
+    # Nothing is encoded when no PNG file has changed.
+    repack_bpv1.search_compressed_bpv1(bpv1_file)
+    assert "Repacked 0 out of 1 textures into" in capsys.readouterr().out
+
+
+def test_repack_compressed_overflow(tmp_path, monkeypatch, capsys):
+    bpv1_file = extract_compressed_sample(
+        tmp_path, monkeypatch, np.zeros((16, 16, 4), dtype=np.uint8)
+    )
+    with open(bpv1_file, "rb") as f:
+        original = f.read()
+
+    # A texture that compresses worse does not fit, and the chunk is left unchanged.
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (16, 16, 4), dtype=np.uint8)
+    Image.fromarray(pixels, "RGBA").save(bpv1_file + "_0x10_000.png")
+    repack_bpv1.search_compressed_bpv1(bpv1_file)
+    output = capsys.readouterr().out
+    assert "Error: Compressed BPV1 chunk at 0x10 exceeds the original chunk by" in output
+    assert "Repacked 0 out of 1" in output
+    with open(bpv1_file, "rb") as f:
+        assert f.read() == original
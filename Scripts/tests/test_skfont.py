@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import skfont_batch
+from utils import skfont
+
+
+def test_encode_tiles():
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 256, (26, 26 * 3), dtype=np.uint8)
+    data = skfont.encode_tiles(pixels)
+    assert len(data) == skfont.tile_length(26) * 3
+
+    # Byte x of row pair y of tile i: upper pixel in the right nybble, lower pixel in the left.
+    for i in range(3):
+        tile = data[i * 338 : (i + 1) * 338]
+        for y in range(13):
+            for x in range(26):
+                upper = pixels[y * 2, i * 26 + x] >> 4
+                lower = pixels[y * 2 + 1, i * 26 + x] >> 4
+                assert tile[y * 26 + x] == upper | (lower << 4)
+
+    with pytest.raises(skfont.SKFONTError):
+        skfont.encode_tiles(pixels[:, :-1])
+    with pytest.raises(skfont.SKFONTError):
+        skfont.encode_tiles(pixels, 24)
+
+
+def test_decode_tiles():
+    rng = np.random.default_rng(0)
+    data = rng.integers(0, 256, skfont.tile_length(24) * 4, dtype=np.uint8).tobytes()
+    tiles = skfont.decode_tiles(data, 24)
+    assert tiles.shape == (4, 24, 24)
+    assert skfont.encode_tiles(skfont.to_row(tiles), 24) == data
+
+
+def test_replace_tiles(tmp_path):
+    pixels = np.random.default_rng(0).integers(0, 16, (26, 52), dtype=np.uint8) << 4
+    Image.fromarray(pixels).convert("RGB").save(tmp_path / "tiles.png")
+    (tmp_path / "manifest.txt").write_text("tiles.png|0x2\ntiles.png|3487\n")
+
+    data = bytearray(skfont.tile_length(26) * skfont.TILE_COUNT)
+    replacements = skfont_batch.read_manifest(tmp_path / "manifest.txt")
+    assert replacements == [(str(tmp_path / "tiles.png"), 2), (str(tmp_path / "tiles.png"), 3487)]
+
+    # The second replacement extends past the last tile and is skipped.
+    assert skfont_batch.replace_tiles(data, 26, replacements) == 2
+    assert len(data) == skfont.tile_length(26) * skfont.TILE_COUNT
+    assert (skfont.decode_tiles(data, 26)[2:4] == pixels.reshape(26, 2, 26).transpose(1, 0, 2)).all()
@@ -0,0 +1,39 @@
+import numpy as np
+
+from utils import twiddle
+
+
+def morton(x, y):
+    # Reference twiddled index: bits of y and x are interleaved, starting with y.
+    output = 0
+    for bit in range(10):
+        output |= ((y >> bit) & 1) << (2 * bit) | ((x >> bit) & 1) << (2 * bit + 1)
+    return output
+
+
+def test_twiddle_indices():
+    indices = twiddle.twiddle_indices(8, 8)
+    assert all(indices[y, x] == morton(x, y) for x in range(8) for y in range(8))
+
+    # Rectangular textures are twiddled in square blocks.
+    indices = twiddle.twiddle_indices(16, 4)
+    assert all(
+        indices[y, x] == (x // 4) * 16 + morton(x % 4, y)
+        for x in range(16)
+        for y in range(4)
+    )
+    indices = twiddle.twiddle_indices(4, 16)
+    assert all(
+        indices[y, x] == (y // 4) * 16 + morton(x, y % 4)
+        for x in range(4)
+        for y in range(16)
+    )
+
+
+def test_twiddle_round_trip():
+    for width, height in ((1, 1), (32, 32), (64, 8), (8, 64)):
+        pixels = np.arange(width * height * 4, dtype=np.uint32).reshape(height, width, 4)
+        twiddled = twiddle.twiddle(pixels)
+        assert twiddled.shape == (width * height, 4)
+        assert (twiddled[twiddle.twiddle_indices(width, height)] == pixels).all()
+        assert (twiddle.untwiddle(twiddled, width, height) == pixels).all()
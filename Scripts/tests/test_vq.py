@@ -0,0 +1,31 @@
+import math
+
+import numpy as np
+
+from utils import vq
+
+
+def test_train_codebook():
+    rng = np.random.default_rng(0)
+    vectors = rng.integers(0, 256, (2000, 16)).astype(np.float32)
+
+    # Vectors that fit in the codebook are returned unchanged.
+    assert (vq.train_codebook(vectors[:10], 16) == np.unique(vectors[:10], axis=0)).all()
+
+    for settings in vq.QUALITY_PRESETS.values():
+        codebook = vq.train_codebook(vectors, 64, seed=1, **settings._asdict())
+        assert codebook.shape == (64, 16)
+        # Training is deterministic for a seed and number of jobs.
+        assert (
+            vq.train_codebook(vectors, 64, seed=1, jobs=2, **settings._asdict()) == codebook
+        ).all()
+
+    # The nearest entry search is the same when split across threads.
+    codebook = vq.train_codebook(vectors, 64)
+    assert (vq.nearest(vectors, codebook) == vq.nearest(vectors, codebook, jobs=4)).all()
+
+
+def test_psnr():
+    original = np.zeros((4, 4), dtype=np.uint8)
+    assert vq.psnr(original, original) == math.inf
+    assert round(vq.psnr(original, original + 1), 2) == 48.13
@@ -0,0 +1,146 @@
+# ADCG functions.
+#
+# An uncompressed ADCG chunk contains an image split into square PVR subtextures of the same size
+# and format. The 32-byte header is followed by a table with 16 bytes per subtexture, containing
+# an ID, the offset of the texture data, and the X and Y coordinates of the subtexture in the image.
+# Texture data offsets are relative to the position 32 bytes after the subtexture's table entry.
+# Some values in the header are currently unknown.
+# NumPy is required as a dependency.
+
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+from utils import pvr
+
+HEADER = struct.Struct("<4sI4sIHH4sBBHHH")
+SUBTEXTURE = struct.Struct("<IIHH4s")
+
+
+class ADCGError(Exception):
+    pass
+
+
+class ADCGSubTexture(NamedTuple):
+    id: int
+    offset: int
+    x: int
+    y: int
+    value1: bytes
+
+
+class ADCGHeader(NamedTuple):
+    size: int
+    value1: bytes
+    "00 00 00, followed by a single byte. Possible signed 2-byte value?"
+    texture_width: int
+    texture_height: int
+    value2: bytes
+    "18 00 00 00. Offset - 8?"
+    pixel_format: int
+    data_format: int
+    value3: int
+    total_width: int
+    total_height: int
+    subtextures: list[ADCGSubTexture]
+    header: bytes
+    "The header and subtexture table as stored in the chunk."
+
+    def texture_range(self, i: int) -> tuple[int, int]:
+        """Return the start and end of the data of subtexture i, relative to
+        the start of the chunk. The last subtexture ends at the end of the
+        chunk."""
+
+        start = self.subtextures[i].offset + HEADER.size + SUBTEXTURE.size * i
+        if i + 1 < len(self.subtextures):
+            end = start + self.subtextures[i + 1].offset - self.subtextures[i].offset + 16
+        else:
+            end = self.size + 8
+
+        return (start, end)
+
+
+def read_adcg(data) -> ADCGHeader:
+    """Parse the header and subtexture table of an uncompressed ADCG chunk.
+
+    Raises ADCGError if the signature is not found or the table is truncated."""
+
+    (
+        signature,
+        size,
+        value1,
+        textures_num,
+        texture_width,
+        texture_height,
+        value2,
+        pixel_format,
+        data_format,
+        value3,
+        total_width,
+        total_height,
+    ) = HEADER.unpack_from(data, 0)
+
+    if signature != b"ADCG":
+        raise ADCGError(f"ADCG signature not found: {signature}")
+
+    header = bytes(data[: HEADER.size + textures_num * SUBTEXTURE.size])
+    if len(header) != HEADER.size + textures_num * SUBTEXTURE.size:
+        raise ADCGError("ADCG subtexture table is truncated")
+
+    subtextures = list(
+        map(ADCGSubTexture._make, SUBTEXTURE.iter_unpack(header[HEADER.size :]))
+    )
+
+    return ADCGHeader(
+        size,
+        value1,
+        texture_width,
+        texture_height,
+        value2,
+        pixel_format,
+        data_format,
+        value3,
+        total_width,
+        total_height,
+        subtextures,
+        header,
+    )
+
+
+def weave(data, header: ADCGHeader = None, errors: list = None) -> np.ndarray:
+    """Decode the subtextures of an uncompressed ADCG chunk and compose them
+    into an RGBA array with the shape (total_height, total_width, 4).
+    Subtextures are clipped to the edges of the image.
+
+    Subtextures that cannot be decoded are left transparent, and the
+    PVRError is appended to errors if specified."""
+
+    if header is None:
+        header = read_adcg(data)
+
+    output = np.zeros((header.total_height, header.total_width, 4), dtype=np.uint8)
+
+    for i, subtexture in enumerate(header.subtextures):
+        start, end = header.texture_range(i)
+        try:
+            pixels = pvr.decode_texture(
+                data[start:end],
+                header.pixel_format,
+                header.data_format,
+                header.texture_width,
+                header.texture_height,
+            )
+        except pvr.PVRError as e:
+            if errors is not None:
+                errors.append(e)
+            continue
+
+        height = min(header.texture_height, header.total_height - subtexture.y)
+        width = min(header.texture_width, header.total_width - subtexture.x)
+        if height > 0 and width > 0:
+            output[
+                subtexture.y : subtexture.y + height, subtexture.x : subtexture.x + width
+            ] = pixels[:height, :width]
+
+    return output
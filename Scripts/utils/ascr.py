@@ -3,11 +3,16 @@
 # Parsed ASCR data is converted into strings delineated with | characters.
 # Rows for the strings contain: string offset, string type ("code", "dialogue", or "lcd"), text converted to UTF-8.
 # Rows for subroutine data contain: four data values, data offset, subroutine name from strings, bytes.
+#
+# AscrChunk holds the same data in a compact form for tools that keep many chunks in memory.
 
 
 import re
 import struct
+import sys
+from array import array
 from io import BytesIO
+from typing import NamedTuple
 
 KNOWN_SIGNATURES = [b"\xba\xaf\x55\xcc", b"\x24\xf7\x01\x65"]
 SJIS_DICT = {
@@ -150,6 +155,17 @@ SJIS_DICT = {
     }
 
 
+# Strings of type "dialogue" or "lcd" containing only these characters are translated with ascii_to_sjis.
+LATIN_TEXT = re.compile(
+    r'[A-zÀ-ÿ0-9œ`~!@#$%^&*(){}_|+\-×÷=?;:<>°\'",.\[\]/—–‘’“”☆★ ]+', re.I
+)
+
+OVERFLOW_MESSAGES = {
+    "last_row": "Last row limit overflow",
+    "line_break": "Line break overflow",
+}
+
+
 class ASCRError(Exception):
     pass
 
@@ -241,10 +257,29 @@ def _linebreak(
     rows, and the number of warnings generated.
     """
 
+    output, rows, last_row_length = _wrap(input_str, length_limit)
+    overflows = _overflows(rows, last_row_length, last_row_length_limit, row_limit)
+
+    for kind in overflows:
+        if filename is not None and line_id is not None:
+            print(
+                f"[Warning] {filename}: {OVERFLOW_MESSAGES[kind]} at line {line_id}: {output}"
+            )
+        else:
+            print(f"[Warning] {OVERFLOW_MESSAGES[kind]}: {output}")
+
+    return (output, rows, len(overflows))
+
+
+def _wrap(input_str, length_limit=37) -> tuple[str, int, int]:
+    """Insert line breaks for _linebreak.
+
+    Returns a tuple containing the output string, the number of rows,
+    and the length counted for the last row."""
+
     output = ""
     current_length = 0
     rows = 1
-    warnings = 0
 
     # Split input string into an enumerated list of each word. Forced line breaks are split into their own word.
     input_str = [i for i in input_str.replace(r"\n", " \\ ").replace("//", " \\ ").split(" ") if i != ""]
@@ -286,25 +321,132 @@ def _linebreak(
             rows += 1
             current_length = 0
 
-    if rows == row_limit and current_length > last_row_length_limit:
-        if filename is not None and line_id is not None:
-            print(
-                f"[Warning] {filename}: Last row limit overflow at line {line_id}: {output}"
-            )
-        else:
-            print(f"[Warning] Last row limit overflow: {output}")
-        warnings += 1
+    return (output, rows, current_length)
+
+
+def _overflows(rows, last_row_length, last_row_length_limit=37, row_limit=3) -> list:
+    """Return a list of the overflow kinds for a string broken into rows
+    by _wrap. The kinds are keys of OVERFLOW_MESSAGES."""
+
+    overflows = []
+
+    if rows == row_limit and last_row_length > last_row_length_limit:
+        overflows.append("last_row")
 
     if rows > row_limit:
-        if filename is not None and line_id is not None:
-            print(
-                f"[Warning] {filename}: Line break overflow at line {line_id}: {output}"
-            )
+        overflows.append("line_break")
+
+    return overflows
+
+
+def invalid_characters(input_str) -> list:
+    """Return a list of the characters in input_str that ascii_to_sjis
+    is unable to convert, in order of appearance and without duplicates.
+    Control codes in {} are checked against the Shift-JIS codec."""
+
+    invalid = []
+    in_control_code = False
+
+    for character in input_str:
+        if in_control_code:
+            if character == "}":
+                in_control_code = False
+                continue
+            try:
+                character.encode("shift_jis")
+                continue
+            except UnicodeError:
+                pass
+        elif character == "{":
+            in_control_code = True
+            continue
+        elif character in SJIS_DICT:
+            continue
+
+        if character not in invalid:
+            invalid.append(character)
+
+    return invalid
+
+
+def unterminated_control_code(input_str) -> bool:
+    """Return True if input_str has a control code starting with { that is
+    not closed with }, which ascii_to_sjis is unable to convert."""
+
+    in_control_code = False
+
+    for character in input_str:
+        if in_control_code:
+            in_control_code = character != "}"
+        elif character == "{":
+            in_control_code = True
+
+    return in_control_code
+
+
+class ValidationIssue(NamedTuple):
+    file: str
+    line_id: int
+    rows: int
+    kind: str
+    "One of the keys of OVERFLOW_MESSAGES, or \"invalid_character\", \"control_code\", \"entry_type\", \"row\", or \"file\"."
+    invalid_characters: list
+    text: str
+
+
+def validate_strings(
+    strings: list,
+    filename: str = None,
+    length_limit=37,
+    last_row_length_limit=37,
+    row_limit=3,
+) -> list[ValidationIssue]:
+    """Check a list of rows in the CSV layout the way write_ascr would
+    encode them, without printing warnings or writing output.
+
+    Returns a list of ValidationIssue for line break overflows, invalid
+    characters, unterminated control codes, unknown entry types and
+    malformed rows."""
+
+    issues = []
+
+    for line_id, row in enumerate(strings, start=1):
+        try:
+            _offset, entry_type, new_text = row
+        except ValueError:
+            issues.append(ValidationIssue(filename, line_id, 0, "row", [], "|".join(row)))
+            continue
+
+        if entry_type != "code" and LATIN_TEXT.fullmatch(new_text):
+            output, rows, last_row_length = _wrap(new_text, length_limit)
+            for kind in _overflows(rows, last_row_length, last_row_length_limit, row_limit):
+                issues.append(ValidationIssue(filename, line_id, rows, kind, [], output))
+            if invalid := invalid_characters(new_text):
+                issues.append(
+                    ValidationIssue(filename, line_id, rows, "invalid_character", invalid, new_text)
+                )
+            if unterminated_control_code(new_text):
+                issues.append(
+                    ValidationIssue(filename, line_id, rows, "control_code", [], new_text)
+                )
+        elif entry_type in ["code", "lcd", "dialogue"]:
+            try:
+                new_text.encode(encoding="shift_jis")
+            except UnicodeError:
+                invalid = []
+                for character in new_text:
+                    try:
+                        character.encode("shift_jis")
+                    except UnicodeError:
+                        if character not in invalid:
+                            invalid.append(character)
+                issues.append(
+                    ValidationIssue(filename, line_id, 0, "invalid_character", invalid, new_text)
+                )
         else:
-            print(f"[Warning] Line break overflow: {output}")
-        warnings += 1
+            issues.append(ValidationIssue(filename, line_id, 0, "entry_type", [], entry_type))
 
-    return (output, rows, warnings)
+    return issues
 
 
 def read_string(file, encoding="shift_jis") -> bytearray:
@@ -329,105 +471,254 @@ def read_string(file, encoding="shift_jis") -> bytearray:
         byte_string += bytes
 
 
-def read_ascr(data: BytesIO, filename="") -> tuple[list,list]:
-    """Parses a BytesIO stream containing an ASCR chunk. Text and
-    subroutine data are processed into strings.
+class AscrText:
+    """A string entry in an ASCR chunk."""
 
-    Returns a tuple containing a list of text strings and a list of
-    the subroutine data.
-    Raises ASCRError if the data input is invalid, such as an
-    unknown signature after the 8-byte header."""
+    __slots__ = ("entry_type", "text")
 
-    if filename != "":
-        filename += ": "
+    def __init__(self, entry_type: str, text: str):
+        self.entry_type = entry_type
+        self.text = text
 
-    # Skip header.
-    data.seek(8)
-
-    header = data.read(4)
-    if header not in KNOWN_SIGNATURES:
-        raise ASCRError(f"{filename}Header not recognized: {header.hex()}")
-
-    # Location of table of offsets for text area at the end of this chunk.
-    text_location = struct.unpack("<I", data.read(4))[0] + 8
-    # Number of strings in this chunk.
-    text_count = struct.unpack("<I", data.read(4))[0]
-    # Location of table of offsets for binary data associated with subroutines.
-    subroutines_location = struct.unpack("<I", data.read(4))[0] + 8
-    # Number of entries in the binary data table.
-    subroutines_count = struct.unpack("<I", data.read(4))[0]
-
-    # Strings are referenced during the writing of the binary data table.
-    text_decoded = []
-
-    # First offset is equal to the location of the offset table
-    # added to the total length of the offsets in this table.
-    text_entries = []
-    data_location = text_location + (text_count * 4)
-
-    for i in range(text_count):
-        data.seek(text_location + (i * 4))  # Seek to location of offset table.
-        data_location = struct.unpack("<I", data.read(4))[0] + text_location
-
-        # Retrieve text.
-        data.seek(data_location)
-        text = read_string(data)
-        if text.isascii():
-            entry_type = "code"
-        else:
-            if "　　▼" in text:
+    def __repr__(self):
+        return f"AscrText({self.entry_type!r}, {self.text!r})"
+
+
+class AscrChunk:
+    """Compact in-memory model of a parsed ASCR chunk.
+
+    String and subroutine locations are stored in array('I') tables,
+    as are the four data values of each subroutine entry. The raw bytes
+    of the subroutine data are copied once into a single buffer and
+    each entry is kept as a memoryview into it.
+
+    Use from_bytes to parse a chunk, and from_rows and to_rows to
+    convert from and to the CSV layout written by read_ascr.py."""
+
+    __slots__ = (
+        "signature",
+        "text_location",
+        "subroutines_location",
+        "text_offsets",
+        "texts",
+        "subroutine_offsets",
+        "subroutine_values",
+        "subroutine_data",
+    )
+
+    def __init__(self, signature: bytes = None):
+        self.signature = signature
+        # Location of table of offsets for text area.
+        self.text_location = 0
+        # Location of table of offsets for binary data associated with subroutines.
+        self.subroutines_location = 0
+        # Absolute location of each string.
+        self.text_offsets = array("I")
+        self.texts: list[AscrText] = []
+        # Absolute location of each subroutine data entry.
+        self.subroutine_offsets = array("I")
+        # Four data values per subroutine entry: data index and data values 2-4.
+        self.subroutine_values = array("I")
+        self.subroutine_data: list[memoryview] = []
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def subroutines_count(self) -> int:
+        return len(self.subroutine_offsets)
+
+    def subroutine_name(self, index: int) -> str:
+        """Return the name of a subroutine entry, which is taken from the
+        strings at the end of the text area."""
+
+        return self.texts[-(self.subroutines_count - index)].text
+
+    @classmethod
+    def from_bytes(cls, data, filename="") -> "AscrChunk":
+        """Parse a bytes-like object containing an ASCR chunk, starting
+        with the ASCR signature.
+
+        Raises ASCRError if the data input is invalid, such as an
+        unknown signature after the 8-byte header."""
+
+        if filename != "":
+            filename += ": "
+
+        if not isinstance(data, bytes):
+            data = bytes(data)
+
+        signature = data[8:12]
+        if signature not in KNOWN_SIGNATURES:
+            raise ASCRError(f"{filename}Header not recognized: {signature.hex()}")
+
+        chunk = cls(signature)
+
+        (
+            text_location,
+            text_count,
+            subroutines_location,
+            subroutines_count,
+        ) = struct.unpack_from("<4I", data, 12)
+        chunk.text_location = text_location = text_location + 8
+        chunk.subroutines_location = subroutines_location = subroutines_location + 8
+
+        # Text offsets are relative to the location of the offset table.
+        text_offsets = array("I", data[text_location : text_location + text_count * 4])
+        if len(text_offsets) != text_count:
+            raise ASCRError(f"{filename}Text offset table is truncated.")
+        if sys.byteorder == "big":
+            text_offsets.byteswap()
+        for i in range(text_count):
+            text_offsets[i] += text_location
+        chunk.text_offsets = text_offsets
+
+        for location in text_offsets:
+            # Strings are terminated with single byte 00.
+            string_end = data.find(b"\x00", location)
+            if string_end == -1:
+                raise ASCRError(f"{filename}Unterminated string at {hex(location)}.")
+            text = data[location:string_end].decode("shift_jis")
+
+            if text.isascii():
+                entry_type = "code"
+            elif "　　▼" in text:
                 entry_type = "lcd"
             else:
                 entry_type = "dialogue"
 
-        text_entries.append([str(i) for i in [hex(data_location), entry_type, text]])
-        text_decoded.append(text)
-
-    # Read the binary data table and output raw values in a separate CSV file.
-    subroutines_data = []
-    data_location = subroutines_location + (subroutines_count * 16)
-
-    for i in range(subroutines_count):
-        data.seek(subroutines_location + (i * 16))
-        data_index = struct.unpack("<I", data.read(4))[0]
-        # Data values 2-4 are currently unknown.
-        data2 = struct.unpack("<I", data.read(4))[0]
-        data3 = struct.unpack("<I", data.read(4))[0]
-        data4 = struct.unpack("<I", data.read(4))[0]
-
-        # Retrieve data.
-        data.seek(data_location)
-        byte_string = bytearray()
-        while True:
-            # Read 4 bytes at a time.
-            # If the last 2 bytes are 40 40, continue with the next data chunk.
-            bytes = data.read(4)
-            byte_string += bytes
-            if bytes[2:] == b"\x40\x40":
-                data_raw = byte_string.hex(" ")
-                break
+            chunk.texts.append(AscrText(entry_type, text))
 
-        subroutines_data.append(
+        values = array(
+            "I",
+            data[subroutines_location : subroutines_location + subroutines_count * 16],
+        )
+        if len(values) != subroutines_count * 4:
+            raise ASCRError(f"{filename}Subroutine table is truncated.")
+        if sys.byteorder == "big":
+            values.byteswap()
+        chunk.subroutine_values = values
+
+        # As there is no offset table for the binary data, each entry starts
+        # at the end of the previous one. An entry ends with a 4-byte value
+        # whose last 2 bytes are 40 40.
+        data_start = subroutines_location + (subroutines_count * 16)
+        data_location = data_start
+        bounds = []
+        for _ in range(subroutines_count):
+            terminator = data.find(b"\x40\x40", data_location + 2)
+            while terminator != -1 and (terminator - data_location) % 4 != 2:
+                terminator = data.find(b"\x40\x40", terminator + 1)
+            if terminator == -1:
+                raise ASCRError(
+                    f"{filename}Unterminated subroutine data at {hex(data_location)}."
+                )
+            chunk.subroutine_offsets.append(data_location)
+            bounds.append((data_location - data_start, terminator + 2 - data_start))
+            data_location = terminator + 2
+
+        # Copy the subroutine data area once so the source chunk can be released.
+        subroutines_raw = memoryview(bytes(data[data_start:data_location]))
+        chunk.subroutine_data = [subroutines_raw[start:end] for start, end in bounds]
+
+        return chunk
+
+    @classmethod
+    def from_rows(cls, text_rows: list, subroutine_rows: list = ()) -> "AscrChunk":
+        """Create a chunk from rows in the CSV layout written by read_ascr.py.
+        The table locations are derived from the first entry of each table.
+
+        Raises ASCRError if a row cannot be parsed."""
+
+        chunk = cls()
+
+        for line, row in enumerate(text_rows, start=1):
+            try:
+                offset, entry_type, text = row
+                chunk.text_offsets.append(int(offset, 16))
+            except ValueError as e:
+                raise ASCRError(f"Error parsing line {line}: {e}")
+            chunk.texts.append(AscrText(entry_type, text))
+
+        subroutines_raw = bytearray()
+        bounds = []
+        for line, row in enumerate(subroutine_rows, start=1):
+            try:
+                data_index, data2, data3, data4, offset, _name, data_raw = row
+                chunk.subroutine_values.extend(
+                    (int(data_index), int(data2), int(data3), int(data4))
+                )
+                chunk.subroutine_offsets.append(int(offset, 16))
+                start = len(subroutines_raw)
+                subroutines_raw += bytes.fromhex(data_raw)
+            except ValueError as e:
+                raise ASCRError(f"Error parsing subroutine line {line}: {e}")
+            bounds.append((start, len(subroutines_raw)))
+
+        subroutines_raw = memoryview(bytes(subroutines_raw))
+        chunk.subroutine_data = [subroutines_raw[start:end] for start, end in bounds]
+
+        if chunk.text_offsets:
+            chunk.text_location = chunk.text_offsets[0] - len(chunk.text_offsets) * 4
+        if chunk.subroutine_offsets:
+            chunk.subroutines_location = (
+                chunk.subroutine_offsets[0] - len(chunk.subroutine_offsets) * 16
+            )
+
+        return chunk
+
+    def text_rows(self) -> list:
+        """Return the strings in the CSV layout: string offset, string type, text."""
+
+        return [
+            [hex(offset), entry.entry_type, entry.text]
+            for offset, entry in zip(self.text_offsets, self.texts)
+        ]
+
+    def subroutine_rows(self) -> list:
+        """Return the subroutine data in the CSV layout: four data values,
+        data offset, subroutine name from strings, bytes."""
+
+        values = self.subroutine_values
+        return [
             [
-                str(i)
-                for i in [
-                    data_index,
-                    data2,
-                    data3,
-                    data4,
-                    hex(data_location),
-                    text_decoded[-(subroutines_count - i)],
-                    data_raw,
-                ]
+                str(values[i * 4]),
+                str(values[i * 4 + 1]),
+                str(values[i * 4 + 2]),
+                str(values[i * 4 + 3]),
+                hex(offset),
+                self.subroutine_name(i),
+                self.subroutine_data[i].hex(" "),
             ]
-        )
+            for i, offset in enumerate(self.subroutine_offsets)
+        ]
+
+    def to_rows(self) -> tuple[list, list]:
+        """Return a tuple containing the text rows and subroutine rows,
+        as returned by read_ascr."""
+
+        return (self.text_rows(), self.subroutine_rows())
+
+
+def read_ascr(data: BytesIO, filename="") -> tuple[list,list]:
+    """Parses a BytesIO stream containing an ASCR chunk. Text and
+    subroutine data are processed into strings.
+
+    Returns a tuple containing a list of text strings and a list of
+    the subroutine data.
+    Raises ASCRError if the data input is invalid, such as an
+    unknown signature after the 8-byte header."""
+
+    data.seek(0)
+    chunk = AscrChunk.from_bytes(data.read(), filename)
+    text_entries, subroutines_data = chunk.to_rows()
 
-        # As there is no offset table for the binary data, reset data_location for next chunk by using the end of the current chunk.
-        data_location = data.tell()
+    if filename != "":
+        filename += ": "
 
     print(
-        f"{filename}Text offset table location: {hex(text_location)}, entries: {text_count}.",
-        f"Subroutine table location: {hex(subroutines_location)}, entries: {subroutines_count}.",
+        f"{filename}Text offset table location: {hex(chunk.text_location)}, entries: {len(chunk)}.",
+        f"Subroutine table location: {hex(chunk.subroutines_location)}, entries: {chunk.subroutines_count}.",
         f"Text start location: {text_entries[0][0]}.",
     )
 
@@ -435,12 +726,14 @@ def read_ascr(data: BytesIO, filename="") -> tuple[list,list]:
 
 
 def write_ascr(
-    ascr_data: BytesIO, strings: list, add_header=True, filename: str = None
+    ascr_data: BytesIO, strings, add_header=True, filename: str = None
 ) -> tuple[bytearray, int]:
     """Given a source ASCR data chunk, create a new chunk from a list
     of strings injected after the subroutine data. Offsets are
     recalculated, and all other data is retained.
 
+    strings is either a list of rows in the CSV layout or an AscrChunk.
+
     If add_header is true, also add a header with ASCR signature and 
     size information and the EOFC footer. If the chunk will be 
     compressed, this should be false.
@@ -455,6 +748,9 @@ def write_ascr(
 
     warnings = 0
 
+    if isinstance(strings, AscrChunk):
+        strings = strings.text_rows()
+
     # Parse ASCR input.
     header = ascr_data.read(16)
     if header[0:4] != b"ASCR":
@@ -486,11 +782,7 @@ def write_ascr(
             ascr_data.close()
             raise ASCRError(f"Error parsing line {i[0]}: {e}")
 
-        if entry_type != "code" and re.fullmatch(
-            r'[A-zÀ-ÿ0-9œ`~!@#$%^&*(){}_|+\-×÷=?;:<>°\'",.\[\]/—–‘’“”☆★ ]+',
-            new_text,
-            re.I,
-        ):
+        if entry_type != "code" and LATIN_TEXT.fullmatch(new_text):
             # Only translate strings that are not type "code" and contain only non-Japanese characters.
             # ascii_to_sjis will pass warning counts, which will be reported at the end of this script's execution.
             line_encoded, warning = ascii_to_sjis(
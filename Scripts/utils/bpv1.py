@@ -0,0 +1,106 @@
+# BPV1 functions.
+#
+# A BPV1 chunk contains PVR textures without their PVRT headers. After the 16-byte header
+# (signature, size, header length, number of textures), the chunk contains a group table with
+# 3 4-byte values per texture, followed by a texture table with 11 4-byte values per texture,
+# followed by the texture data.
+#
+# Offsets in the group table point to the texture table entries, and offsets in the texture
+# table point to the texture data. Both are relative to the position 8 bytes into the chunk.
+# Texture table entries contain the PVR pixel format and data format in bytes 6 and 7, and the
+# width and height in the 5th and 6th values. The remaining values are unknown.
+
+import struct
+from typing import NamedTuple
+
+HEADER = struct.Struct("<4sIII")
+GROUP = struct.Struct("<3I")
+TEXTURE = struct.Struct("<IHBB9I")
+
+# Length of the group table and texture table entries for one texture.
+TABLE_ENTRY_LENGTH = GROUP.size + TEXTURE.size
+
+
+class BPV1Error(Exception):
+    pass
+
+
+class BPV1Group(NamedTuple):
+    offset: int
+    value1: int
+    value2: int
+
+
+class BPV1Texture(NamedTuple):
+    offset: int
+    value0: int
+    pixel_format: int
+    data_format: int
+    value1: int
+    value2: int
+    width: int
+    height: int
+    value3: int
+    value4: int
+    value5: int
+    value6: int
+    value7: int
+
+
+class BPV1Table(NamedTuple):
+    size: int
+    "Size of the chunk, excluding the 8-byte signature and size."
+    header_length: int
+    groups: list[BPV1Group]
+    textures: list[BPV1Texture]
+    tables: bytes
+    "The group table and texture table as stored in the chunk."
+
+    def texture_range(self, i: int) -> tuple[int, int]:
+        """Return the start and end of the data of texture i, relative to
+        the start of the chunk. The data of a texture ends at the start of
+        the next texture, or at the end of the chunk."""
+
+        start = self.textures[i].offset + 8
+        if i + 1 < len(self.textures):
+            end = self.textures[i + 1].offset + 8
+        else:
+            end = self.size + 8
+
+        return (start, end)
+
+
+def read_bpv1(data, offset=0, warnings: list = None) -> BPV1Table:
+    """Parse the header and tables of the BPV1 chunk at offset in a
+    bytes-like object, such as an mmap.
+
+    Group table entries are expected to point to the texture table entries
+    in order. Entries that do not are still parsed, and a message is
+    appended to warnings if specified.
+
+    Raises BPV1Error if the signature is not found or the tables are truncated."""
+
+    signature, size, header_length, texture_count = HEADER.unpack_from(data, offset)
+    if signature != b"BPV1":
+        raise BPV1Error(f"BPV1 signature not found at {hex(offset)}: {signature}")
+
+    tables_start = offset + HEADER.size
+    texture_table_start = tables_start + texture_count * GROUP.size
+    tables = bytes(data[tables_start : tables_start + texture_count * TABLE_ENTRY_LENGTH])
+    if len(tables) != texture_count * TABLE_ENTRY_LENGTH:
+        raise BPV1Error(f"BPV1 tables at {hex(offset)} are truncated")
+
+    group_table_length = texture_table_start - tables_start
+    groups = list(map(BPV1Group._make, GROUP.iter_unpack(tables[:group_table_length])))
+    textures = list(
+        map(BPV1Texture._make, TEXTURE.iter_unpack(tables[group_table_length:]))
+    )
+
+    for i, group in enumerate(groups):
+        if offset + 8 + group.offset != texture_table_start + i * TEXTURE.size:
+            if warnings is not None:
+                warnings.append(
+                    f"Group {i} of BPV1 chunk at {hex(offset)} does not point to texture table entry {i} ({hex(group.offset)})"
+                )
+
+    return BPV1Table(size, header_length, groups, textures, tables)
@@ -0,0 +1,268 @@
+# Chunk scanner.
+#
+# Files on the disc contain chunks that start with a 4-byte signature at 4-byte alignment.
+# PRS-compressed chunks end with a CPRS footer, and most chunks are followed by an EOFC footer.
+# scan_chunks makes one pass over a file or buffer and returns the locations of all known
+# signatures, sorted by offset, so that extractors can share a single index.
+#
+# load_index saves the index of a file as a JSON sidecar file next to it, listing the offset,
+# signature, compressed and uncompressed length, and SHA-1 hash of each chunk. The sidecar file
+# is reused as long as the size and modification time of the file are unchanged.
+#
+# load_slots saves the original length of each chunk as a second sidecar file. When a compressed
+# chunk is replaced by a shorter one and the remaining space is filled with byte 00, the index
+# measures the shorter chunk, so scripts that write chunks into a file use the saved lengths as
+# the space available to each chunk.
+# NumPy is required as a dependency.
+
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+from typing import NamedTuple
+
+import numpy as np
+
+CHUNK_SIGNATURES = (
+    b"ASCR",
+    b"BPV1",
+    b"ADCG",
+    b"CTPA",
+    b"LCD1",
+    b"ALPD",
+    b"GRO1",
+    b"CPRS",
+    b"EOFC",
+)
+
+FOOTER_SIGNATURES = (b"CPRS", b"EOFC")
+
+INDEX_EXTENSION = ".chunks.json"
+INDEX_VERSION = 2
+
+SLOTS_EXTENSION = ".slots.json"
+SLOTS_VERSION = 1
+
+# Number of 4-byte values compared at a time.
+_BLOCK_SIZE = 1 << 20
+
+
+class ChunkLocation(NamedTuple):
+    offset: int
+    signature: bytes
+
+
+class ChunkInfo(NamedTuple):
+    offset: int
+    signature: bytes
+    compressed_length: int
+    "Length of the chunk in the file, including the CPRS and EOFC footers."
+    uncompressed_length: int
+    "Length of the chunk after decompression, including its 8-byte header. Equal to compressed_length if the chunk is not compressed."
+    sha1: str
+
+
+def scan_chunks(
+    data, signatures=CHUNK_SIGNATURES, start=0, end=None
+) -> list[ChunkLocation]:
+    """Search a bytes-like object, such as an mmap, for signatures at
+    4-byte alignment between start and end.
+
+    Returns a list of ChunkLocation sorted by offset."""
+
+    if end is None or end > len(data):
+        end = len(data)
+    # Round start up to the next 4-byte boundary.
+    start = (start + 3) & ~3
+
+    values = {
+        int.from_bytes(signature, "little"): bytes(signature) for signature in signatures
+    }
+    keys = np.array(list(values), dtype="<u4")
+
+    index = []
+    for block_start in range(start, end - 3, _BLOCK_SIZE * 4):
+        count = min(_BLOCK_SIZE, (end - block_start) // 4)
+        words = np.frombuffer(data, dtype="<u4", count=count, offset=block_start)
+
+        mask = words == keys[0]
+        for key in keys[1:]:
+            mask |= words == key
+
+        for position in np.flatnonzero(mask).tolist():
+            offset = block_start + position * 4
+            index.append(ChunkLocation(offset, values[int(words[position])]))
+
+    return index
+
+
+def scan_file(filename: str, signatures=CHUNK_SIGNATURES) -> list[ChunkLocation]:
+    """Open a file as a memory map and scan it with scan_chunks."""
+
+    with open(filename, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return scan_chunks(mm, signatures)
+
+
+def filter_chunks(index: list, signature: bytes) -> list[ChunkLocation]:
+    """Return the entries in index with the given signature."""
+
+    return [i for i in index if i.signature == signature]
+
+
+def find_next(index: list, offset: int, signature: bytes) -> int:
+    """Return the offset of the first entry in index with the given
+    signature after offset, or -1 if there is none. Use this to find
+    the CPRS or EOFC footer of a chunk."""
+
+    for i in index[bisect.bisect_right(index, (offset, b"\xff" * 4)) :]:
+        if i.signature == signature:
+            return i.offset
+
+    return -1
+
+
+def describe_chunks(data, index: list) -> list[ChunkInfo]:
+    """Determine the length and hash of each chunk in an index returned
+    by scan_chunks. Footers are not listed.
+
+    The size in the header of a chunk excludes the 8-byte signature and
+    size. A chunk is PRS-compressed if a CPRS footer follows at that size,
+    in which case the size is the padded length of the compressed data plus
+    the CPRS footer. The chunk ends after the CPRS footer, or after the EOFC
+    footer if one follows. Signatures found inside compressed data are not
+    listed."""
+
+    info = []
+    compressed_end = 0
+
+    for offset, signature in index:
+        if signature in FOOTER_SIGNATURES or offset < compressed_end:
+            continue
+        if offset + 16 > len(data):
+            continue
+
+        end = offset + struct.unpack_from("<I", data, offset + 4)[0] + 8
+        if data[end : end + 4] == b"CPRS":
+            end += 8
+            uncompressed_length = struct.unpack_from("<I", data, offset + 8)[0]
+        else:
+            uncompressed_length = None
+        if end + 8 <= len(data) and data[end : end + 4] == b"EOFC":
+            end += 8
+        end = min(end, len(data))
+
+        if uncompressed_length is None:
+            uncompressed_length = end - offset
+        else:
+            compressed_end = end
+
+        info.append(
+            ChunkInfo(
+                offset,
+                signature,
+                end - offset,
+                uncompressed_length,
+                hashlib.sha1(data[offset:end]).hexdigest(),
+            )
+        )
+
+    return info
+
+
+def load_index(filename: str, rebuild=False) -> list[ChunkInfo]:
+    """Return the list of ChunkInfo for all chunks in a file.
+
+    The index is read from the sidecar file if the size and modification
+    time recorded in it match the file. Otherwise, the file is scanned
+    and the sidecar file is written. Set rebuild to True to always scan."""
+
+    index_filename = filename + INDEX_EXTENSION
+    stat = os.stat(filename)
+
+    if not rebuild and os.path.isfile(index_filename):
+        try:
+            with open(index_filename, encoding="utf-8") as index_file:
+                saved = json.load(index_file)
+            if (
+                saved["version"] == INDEX_VERSION
+                and saved["size"] == stat.st_size
+                and saved["mtime_ns"] == stat.st_mtime_ns
+            ):
+                return [
+                    ChunkInfo(offset, signature.encode("ascii"), *values)
+                    for offset, signature, *values in saved["chunks"]
+                ]
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[Warning] {index_filename}: Unable to read index: {e}")
+
+    if stat.st_size == 0:
+        info = []
+    else:
+        with open(filename, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                info = describe_chunks(mm, scan_chunks(mm))
+
+    try:
+        with open(index_filename, "w", encoding="utf-8") as index_file:
+            json.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "size": stat.st_size,
+                    "mtime_ns": stat.st_mtime_ns,
+                    "chunks": [
+                        [i.offset, i.signature.decode("ascii"), *i[2:]] for i in info
+                    ],
+                },
+                index_file,
+            )
+    except OSError as e:
+        print(f"[Warning] {index_filename}: Unable to write index: {e}")
+
+    return info
+
+
+def load_slots(filename: str, index: list) -> dict[int, int]:
+    """Return the space available to each chunk in index, a list returned by
+    load_index for filename, keyed by offset.
+
+    The space of a chunk is its length when it is first seen, read from the
+    sidecar file if it was saved before. Lengths of chunks that are not in
+    the sidecar file are taken from index and saved."""
+
+    slots_filename = filename + SLOTS_EXTENSION
+    slots = {}
+
+    if os.path.isfile(slots_filename):
+        try:
+            with open(slots_filename, encoding="utf-8") as slots_file:
+                saved = json.load(slots_file)
+            if saved["version"] == SLOTS_VERSION:
+                slots = {offset: length for offset, length in saved["slots"]}
+        except (ValueError, KeyError, TypeError) as e:
+            print(f"[Warning] {slots_filename}: Unable to read slot lengths: {e}")
+
+    missing = {i.offset: i.compressed_length for i in index if i.offset not in slots}
+    if missing:
+        slots.update(missing)
+        save_slots(filename, slots)
+
+    return {i.offset: slots[i.offset] for i in index}
+
+
+def save_slots(filename: str, slots: dict[int, int]):
+    """Write the slot lengths returned by load_slots to the sidecar file of
+    filename, such as a copy of the file they were loaded for."""
+
+    slots_filename = filename + SLOTS_EXTENSION
+    try:
+        with open(slots_filename, "w", encoding="utf-8") as slots_file:
+            json.dump(
+                {"version": SLOTS_VERSION, "slots": sorted(slots.items())}, slots_file
+            )
+    except OSError as e:
+        print(f"[Warning] {slots_filename}: Unable to write slot lengths: {e}")
@@ -0,0 +1,26 @@
+# Process pool helpers.
+
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+
+
+def imap_unordered(executor: Executor, fn, tasks, window: int):
+    """Call fn with the arguments in each tuple from the iterable tasks in
+    executor, and yield the results in the order they complete.
+
+    At most window tasks are submitted at a time, and tasks is consumed
+    only as results are yielded, so a generator of tasks is never read
+    ahead of the workers by more than window items."""
+
+    pending = set()
+
+    for task in tasks:
+        if len(pending) >= window:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(executor.submit(fn, *task))
+
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
@@ -0,0 +1,422 @@
+# PVR texture functions.
+#
+# PVR format information is based on https://github.com/nickworonekin/puyotools/wiki/PVR-Texture
+# Textures are decoded into NumPy arrays of RGBA pixels with the shape (height, width, 4),
+# which can be converted to a Pillow Image with to_image.
+# Textures are encoded from the same arrays, which can be read from a Pillow Image with
+# from_image. The encoded data has the same layout and length as texture data in BPV1 and ADCG
+# chunks, so it can replace the original data directly.
+# NumPy and Pillow are required as dependencies.
+#
+# Twiddled textures store pixels in Morton order, as described in twiddle.py.
+# VQ textures contain a codebook of 2x2 blocks followed by one twiddled index per block.
+# When encoding, the codebook is trained with vq.py on the blocks of all mipmap levels.
+# Indexed textures require an external palette. Without one, they are decoded in grayscale,
+# and cannot be encoded.
+
+import struct
+from typing import NamedTuple
+
+import numpy as np
+from PIL import Image
+
+from utils import vq
+from utils.twiddle import twiddle, twiddle_indices, untwiddle
+
+PIXEL_FORMATS = {0: "ARGB1555", 1: "RGB565", 2: "ARGB4444"}
+
+
+class DataFormat(NamedTuple):
+    name: str
+    layout: str
+    "One of \"twiddled\", \"rectangle\", \"rectangle_twiddled\", \"vq\", \"small_vq\", \"index4\", or \"index8\"."
+    mipmaps: bool
+    mipmap_padding: int
+    "Bytes preceding the 1x1 mipmap."
+
+
+# fmt: off
+DATA_FORMATS = {
+    0x1: DataFormat("Square, twiddled", "twiddled", False, 0),
+    0x2: DataFormat("Square, twiddled, mipmaps", "twiddled", True, 2),
+    0x3: DataFormat("VQ", "vq", False, 0),
+    0x4: DataFormat("VQ, mipmaps", "vq", True, 0),
+    0x5: DataFormat("4bpp indexed", "index4", False, 0),
+    0x6: DataFormat("4bpp indexed, mipmaps", "index4", True, 3),
+    0x7: DataFormat("8bpp indexed", "index8", False, 0),
+    0x8: DataFormat("8bpp indexed, mipmaps", "index8", True, 3),
+    0x9: DataFormat("Rectangle", "rectangle", False, 0),
+    0xB: DataFormat("Rectangle, stride", "rectangle", False, 0),
+    0xD: DataFormat("Rectangle, twiddled", "rectangle_twiddled", False, 0),
+    0x10: DataFormat("Small VQ", "small_vq", False, 0),
+    0x11: DataFormat("Small VQ, mipmaps", "small_vq", True, 0),
+    0x12: DataFormat("Square, twiddled, mipmaps (alternate)", "twiddled", True, 6),
+}
+# fmt: on
+
+
+class PVRError(Exception):
+    pass
+
+
+def _bits_per_pixel(layout: str) -> int:
+    if layout == "index4":
+        return 4
+    if layout in ("index8", "vq", "small_vq"):
+        return 8
+    return 16
+
+
+def codebook_size(data_format: int, width: int) -> int:
+    """Return the number of entries in the codebook of a VQ texture."""
+
+    if DATA_FORMATS[data_format].layout == "vq":
+        return 256
+
+    # Small VQ codebook sizes depend on the texture size.
+    if width <= 16:
+        return 16
+    if width == 32:
+        return 64 if DATA_FORMATS[data_format].mipmaps else 32
+    if width == 64:
+        return 256 if DATA_FORMATS[data_format].mipmaps else 128
+    return 256
+
+
+def mipmap_offset(data_format: int, width: int) -> int:
+    """Return the offset of the full size texture after the smaller
+    mipmap levels, not counting the VQ codebook. Returns 0 for formats
+    without mipmaps."""
+
+    data_format_info = DATA_FORMATS[data_format]
+    if not data_format_info.mipmaps:
+        return 0
+
+    offset = data_format_info.mipmap_padding
+    size = 1
+    while size < width:
+        if data_format_info.layout in ("vq", "small_vq"):
+            # One index byte per 2x2 block. The 1x1 level uses a full byte.
+            offset += max((size // 2) ** 2, 1)
+        else:
+            offset += max(size * size * _bits_per_pixel(data_format_info.layout) // 8, 1)
+        size *= 2
+
+    return offset
+
+
+def texture_length(data_format: int, width: int, height: int) -> int:
+    """Return the length in bytes of texture data in the given format,
+    including the codebook and mipmaps."""
+
+    layout = DATA_FORMATS[data_format].layout
+    length = mipmap_offset(data_format, width)
+
+    if layout in ("vq", "small_vq"):
+        length += codebook_size(data_format, width) * 8 + (width * height) // 4
+    else:
+        length += (width * height * _bits_per_pixel(layout)) // 8
+
+    return length
+
+
+def decode_pixels(values: np.ndarray, pixel_format: int) -> np.ndarray:
+    """Convert an array of 16-bit pixel values to RGBA. The output has the
+    shape of values with an added axis of length 4."""
+
+    values = values.astype(np.uint16)
+    output = np.empty(values.shape + (4,), dtype=np.uint8)
+
+    if pixel_format == 0:  # ARGB1555
+        for channel, shift in enumerate((10, 5, 0)):
+            c = ((values >> shift) & 0x1F).astype(np.uint8)
+            output[..., channel] = (c << 3) | (c >> 2)
+        output[..., 3] = np.where(values & 0x8000, 255, 0)
+    elif pixel_format == 1:  # RGB565
+        r = ((values >> 11) & 0x1F).astype(np.uint8)
+        g = ((values >> 5) & 0x3F).astype(np.uint8)
+        b = (values & 0x1F).astype(np.uint8)
+        output[..., 0] = (r << 3) | (r >> 2)
+        output[..., 1] = (g << 2) | (g >> 4)
+        output[..., 2] = (b << 3) | (b >> 2)
+        output[..., 3] = 255
+    elif pixel_format == 2:  # ARGB4444
+        for channel, shift in enumerate((8, 4, 0, 12)):
+            output[..., channel] = ((values >> shift) & 0xF).astype(np.uint8) * 17
+    else:
+        raise PVRError(f"Unsupported pixel format: {hex(pixel_format)}")
+
+    return output
+
+
+def decode_texture(
+    data,
+    pixel_format: int,
+    data_format: int,
+    width: int,
+    height: int,
+    palette: np.ndarray = None,
+) -> np.ndarray:
+    """Decode PVR texture data, without the PVRT header, into an RGBA array
+    with the shape (height, width, 4). For textures with mipmaps, only the
+    full size texture is decoded.
+
+    palette is an optional RGBA array with the shape (entries, 4) for
+    indexed textures.
+
+    Raises PVRError if the format is not supported or the data is too short."""
+
+    if data_format not in DATA_FORMATS:
+        raise PVRError(f"Unsupported data format: {hex(data_format)}")
+
+    layout = DATA_FORMATS[data_format].layout
+    if len(data) < (length := texture_length(data_format, width, height)):
+        raise PVRError(
+            f"Texture data is too short for {width}x{height} {DATA_FORMATS[data_format].name} ({len(data)} bytes, expected {length})"
+        )
+
+    data = np.frombuffer(data, dtype=np.uint8, count=length)
+    offset = mipmap_offset(data_format, width)
+
+    if layout == "rectangle":
+        values = data[offset:].view("<u2").reshape(height, width)
+        return decode_pixels(values, pixel_format)
+
+    if layout in ("twiddled", "rectangle_twiddled"):
+        values = data[offset:].view("<u2")
+        return decode_pixels(untwiddle(values, width, height), pixel_format)
+
+    if layout in ("vq", "small_vq"):
+        entries = codebook_size(data_format, width)
+        codebook = decode_pixels(
+            data[: entries * 8].view("<u2").reshape(entries, 4), pixel_format
+        )
+        indices = data[entries * 8 + offset :]
+        twiddled = twiddle_indices(width, height)
+        # Each index selects a 2x2 block, whose pixels are also in twiddled order.
+        return codebook[indices[twiddled >> 2], twiddled & 3]
+
+    # Indexed textures.
+    twiddled = twiddle_indices(width, height)
+    if layout == "index4":
+        indices = (data[offset + (twiddled >> 1)] >> ((twiddled & 1) << 2)) & 0xF
+        entries = 16
+    else:
+        indices = data[offset + twiddled]
+        entries = 256
+
+    if palette is None:
+        levels = (np.arange(entries) * 255 // (entries - 1)).astype(np.uint8)
+        palette = np.stack(
+            (levels, levels, levels, np.full(entries, 255, dtype=np.uint8)), axis=1
+        )
+
+    return np.asarray(palette, dtype=np.uint8)[indices]
+
+
+def read_header(data) -> tuple[int, int, int, int, int]:
+    """Read the header of a PVR file, skipping a GBIX header if present.
+
+    Returns a tuple containing the pixel format, data format, width,
+    height, and the offset of the texture data.
+    Raises PVRError if the PVRT signature is not found."""
+
+    offset = 0
+    if data[0:4] == b"GBIX":
+        offset = 8 + struct.unpack_from("<I", data, 4)[0]
+
+    if data[offset : offset + 4] != b"PVRT":
+        raise PVRError(f"Header not recognized: {bytes(data[offset : offset + 4])}")
+
+    pixel_format, data_format, _, width, height = struct.unpack_from(
+        "<BBHHH", data, offset + 8
+    )
+
+    return (pixel_format, data_format, width, height, offset + 16)
+
+
+def decode_pvr(data, palette: np.ndarray = None) -> np.ndarray:
+    """Decode the contents of a PVR file into an RGBA array."""
+
+    pixel_format, data_format, width, height, offset = read_header(data)
+
+    return decode_texture(
+        memoryview(data)[offset:], pixel_format, data_format, width, height, palette
+    )
+
+
+def to_image(pixels: np.ndarray) -> Image.Image:
+    """Convert an RGBA array returned by decode_texture to a Pillow Image."""
+
+    return Image.fromarray(np.ascontiguousarray(pixels), "RGBA")
+
+
+def from_image(image: Image.Image) -> np.ndarray:
+    """Convert a Pillow Image to an RGBA array for encode_texture."""
+
+    return np.asarray(image.convert("RGBA"), dtype=np.uint8)
+
+
+def encode_pixels(pixels: np.ndarray, pixel_format: int) -> np.ndarray:
+    """Convert an array of RGBA pixels to 16-bit pixel values, rounding
+    each channel to the nearest value. The output has the shape of pixels
+    without the last axis."""
+
+    pixels = pixels.astype(np.uint32)
+
+    def scale(channel, maximum):
+        return (pixels[..., channel] * maximum + 127) // 255
+
+    if pixel_format == 0:  # ARGB1555
+        values = (
+            np.where(pixels[..., 3] >= 128, 0x8000, 0)
+            | scale(0, 31) << 10
+            | scale(1, 31) << 5
+            | scale(2, 31)
+        )
+    elif pixel_format == 1:  # RGB565
+        values = scale(0, 31) << 11 | scale(1, 63) << 5 | scale(2, 31)
+    elif pixel_format == 2:  # ARGB4444
+        values = scale(3, 15) << 12 | scale(0, 15) << 8 | scale(1, 15) << 4 | scale(2, 15)
+    else:
+        raise PVRError(f"Unsupported pixel format: {hex(pixel_format)}")
+
+    return values.astype("<u2")
+
+
+def _mipmap_levels(pixels: np.ndarray) -> list[np.ndarray]:
+    """Return the mipmap levels of a square texture, from 1x1 to the full
+    size texture. Each level is the 2x2 box filtered previous level."""
+
+    levels = [pixels]
+    level = pixels.astype(np.float32)
+    while level.shape[0] > 1:
+        level = level.reshape(level.shape[0] // 2, 2, level.shape[1] // 2, 2, 4).mean(
+            axis=(1, 3)
+        )
+        levels.append(np.rint(level).astype(np.uint8))
+
+    return levels[::-1]
+
+
+def _encode_vq(
+    levels: list[np.ndarray], pixel_format: int, entries: int, quality: str, jobs: int
+) -> tuple[bytes, bytes]:
+    """Encode the mipmap levels of a VQ texture.
+
+    Returns a tuple containing the codebook and the indices of all levels."""
+
+    blocks = []
+    for level in levels:
+        if level.shape[0] == 1:
+            # The 1x1 level uses one block containing the single pixel.
+            blocks.append(np.repeat(level.reshape(1, 4), 4, axis=0).reshape(1, 16))
+        else:
+            blocks.append(twiddle(level).reshape(-1, 16))
+    vectors = np.concatenate(blocks).astype(np.float32)
+
+    # Quantize the trained codebook to the pixel format before assigning indices.
+    trained = vq.train_codebook(
+        vectors, entries, jobs=jobs, **vq.QUALITY_PRESETS[quality]._asdict()
+    )
+    values = encode_pixels(np.rint(trained).clip(0, 255).reshape(-1, 4, 4), pixel_format)
+    codebook = np.zeros((entries, 4), dtype="<u2")
+    codebook[: len(values)] = values
+    indices = vq.nearest(vectors, decode_pixels(values, pixel_format).reshape(-1, 16), jobs)
+
+    return (codebook.tobytes(), indices.astype(np.uint8).tobytes())
+
+
+def encode_texture(
+    pixels: np.ndarray,
+    pixel_format: int,
+    data_format: int,
+    palette: np.ndarray = None,
+    vq_quality="normal",
+    jobs=1,
+) -> bytes:
+    """Encode an RGBA array with the shape (height, width, 4) into PVR
+    texture data, without the PVRT header. Mipmaps are generated for
+    formats that include them.
+
+    palette is an RGBA array with the shape (entries, 4), required for
+    indexed textures. Each pixel is mapped to the nearest entry.
+
+    vq_quality is a key of vq.QUALITY_PRESETS, and jobs is the number of
+    threads used for VQ textures.
+
+    Raises PVRError if the format is not supported or the dimensions are
+    not valid for the format."""
+
+    if data_format not in DATA_FORMATS:
+        raise PVRError(f"Unsupported data format: {hex(data_format)}")
+
+    data_format_info = DATA_FORMATS[data_format]
+    layout = data_format_info.layout
+    height, width = pixels.shape[:2]
+
+    if pixels.ndim != 3 or pixels.shape[2] != 4:
+        raise PVRError(f"Expected RGBA pixels, got array with shape {pixels.shape}")
+
+    if layout != "rectangle" and (width & (width - 1) or height & (height - 1)):
+        raise PVRError(
+            f"Dimensions of {DATA_FORMATS[data_format].name} texture must be powers of 2, got {width}x{height}"
+        )
+
+    if layout in ("twiddled", "vq", "small_vq", "index4", "index8") and width != height:
+        raise PVRError(
+            f"{DATA_FORMATS[data_format].name} texture must be square, got {width}x{height}"
+        )
+
+    if layout == "rectangle":
+        return encode_pixels(pixels, pixel_format).tobytes()
+
+    levels = _mipmap_levels(pixels) if data_format_info.mipmaps else [pixels]
+
+    if layout in ("vq", "small_vq"):
+        codebook, indices = _encode_vq(
+            levels, pixel_format, codebook_size(data_format, width), vq_quality, jobs
+        )
+        return codebook + indices
+
+    output = bytearray(data_format_info.mipmap_padding)
+
+    if layout in ("twiddled", "rectangle_twiddled"):
+        for level in levels:
+            output += twiddle(encode_pixels(level, pixel_format)).tobytes()
+        return bytes(output)
+
+    # Indexed textures.
+    if palette is None:
+        raise PVRError(f"{DATA_FORMATS[data_format].name} texture requires a palette")
+
+    for level in levels:
+        indices = vq.nearest(twiddle(level), palette).astype(np.uint8)
+        if layout == "index4":
+            if len(indices) % 2:
+                indices = np.append(indices, np.uint8(0))
+            indices = (indices[0::2] & 0xF) | (indices[1::2] & 0xF) << 4
+        output += indices.tobytes()
+
+    return bytes(output)
+
+
+def encode_pvr(
+    pixels: np.ndarray,
+    pixel_format: int,
+    data_format: int,
+    palette: np.ndarray = None,
+    vq_quality="normal",
+    jobs=1,
+) -> bytes:
+    """Encode an RGBA array into the contents of a PVR file, with the same
+    header written by extract_bpv1.py."""
+
+    height, width = pixels.shape[:2]
+    data = encode_texture(pixels, pixel_format, data_format, palette, vq_quality, jobs)
+
+    return (
+        b"PVRT"
+        + struct.pack("<IBBHHH", len(data) + 8, pixel_format, data_format, 0, width, height)
+        + data
+    )
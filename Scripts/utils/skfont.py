@@ -0,0 +1,87 @@
+# SKFONT functions.
+#
+# SKFONT.CG contains square font tiles with 4 bits per pixel. Each byte represents two pixels
+# stacked vertically: the right nybble is the upper pixel and the left nybble is the lower pixel.
+# A tile is stored as size / 2 rows of these bytes, each size bytes long.
+#
+# Tile images are 8-bit grayscale arrays with the tiles in a single row. Only the upper 4 bits
+# of each pixel are stored.
+# NumPy is required as a dependency.
+
+import numpy as np
+
+# Number of tiles in each font sheet.
+TILE_COUNT = 3488
+
+# Tile size for each font sheet, by file size.
+TILE_SIZES = {
+    1178944: 26,
+    1004544: 24,
+    844096: 22,
+}
+
+
+class SKFONTError(Exception):
+    pass
+
+
+def tile_length(size: int) -> int:
+    """Return the length in bytes of a tile of size x size pixels."""
+
+    return size * size // 2
+
+
+def tile_size(file_size: int) -> int:
+    """Return the tile size of a font sheet from its file size.
+
+    Raises SKFONTError if the file size does not match a known font sheet."""
+
+    try:
+        return TILE_SIZES[file_size]
+    except KeyError:
+        raise SKFONTError(f"Unknown SKFONT file size: {file_size}") from None
+
+
+def decode_tiles(data, size=26, count: int = None) -> np.ndarray:
+    """Decode count tiles from the start of data, or as many whole tiles as
+    data contains, into an 8-bit array with the shape (count, size, size)."""
+
+    if count is None:
+        count = len(data) // tile_length(size)
+    packed = np.frombuffer(data, dtype=np.uint8, count=count * tile_length(size)).reshape(
+        count, size // 2, size
+    )
+
+    pixels = np.empty((count, size, size), dtype=np.uint8)
+    pixels[:, 0::2] = (packed & 0x0F) << 4
+    pixels[:, 1::2] = packed & 0xF0
+
+    return pixels
+
+
+def to_row(tiles: np.ndarray) -> np.ndarray:
+    """Arrange an array of tiles with the shape (count, size, size) into a
+    single row with the shape (size, size * count). This is the layout
+    accepted by encode_tiles."""
+
+    count, size = tiles.shape[:2]
+
+    return tiles.transpose(1, 0, 2).reshape(size, count * size)
+
+
+def encode_tiles(pixels: np.ndarray, size=26) -> bytes:
+    """Encode an 8-bit array with the shape (size, size * tile count),
+    containing a single row of tiles, into SKFONT tile data.
+
+    Raises SKFONTError if the array is not a row of size x size tiles."""
+
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.ndim != 2 or pixels.shape[0] != size or pixels.shape[1] % size:
+        raise SKFONTError(
+            f"Image must have a height of {size} pixels and a width that is a multiple of {size} pixels: {pixels.shape[1::-1]}"
+        )
+
+    # Split the row into tiles with the shape (tile count, size, size).
+    tiles = pixels.reshape(size, -1, size).transpose(1, 0, 2)
+
+    return ((tiles[:, 1::2] & 0xF0) | (tiles[:, 0::2] >> 4)).tobytes()
@@ -0,0 +1,74 @@
+# Twiddle functions for PVR textures.
+#
+# Twiddled textures store pixels in Morton order, with bit 0 of the index taken from the y
+# coordinate and bit 1 from the x coordinate. Rectangular textures are twiddled in square blocks
+# with the length of the shorter side, and the blocks are stored one after another.
+#
+# The index tables for each texture size are computed once and cached, so converting a texture
+# is a single NumPy gather. The cached tables are read-only.
+# NumPy is required as a dependency.
+
+from functools import lru_cache
+
+import numpy as np
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert a 0 bit between each of the lower 16 bits of values."""
+
+    values = values.astype(np.uint32) & 0xFFFF
+    values = (values | (values << 8)) & 0x00FF00FF
+    values = (values | (values << 4)) & 0x0F0F0F0F
+    values = (values | (values << 2)) & 0x33333333
+    values = (values | (values << 1)) & 0x55555555
+
+    return values
+
+
+@lru_cache(maxsize=32)
+def twiddle_indices(width: int, height: int) -> np.ndarray:
+    """Return an array with the shape (height, width) containing the index
+    of each pixel in twiddled data."""
+
+    size = min(width, height)
+    x = np.arange(width, dtype=np.uint32)
+    y = np.arange(height, dtype=np.uint32)
+
+    # Number of the square block containing each pixel.
+    block_x = (x // size) * size * size
+    block_y = (y // size) * size * size
+
+    output = (block_x[np.newaxis, :] + block_y[:, np.newaxis]) + (
+        (_spread_bits(x % size) << 1)[np.newaxis, :] | _spread_bits(y % size)[:, np.newaxis]
+    )
+    output.setflags(write=False)
+
+    return output
+
+
+@lru_cache(maxsize=32)
+def linear_indices(width: int, height: int) -> np.ndarray:
+    """Return a flat array containing the index in row-major order of each
+    pixel in twiddled data. This is the inverse of twiddle_indices."""
+
+    output = np.empty(width * height, dtype=np.uint32)
+    output[twiddle_indices(width, height).ravel()] = np.arange(width * height, dtype=np.uint32)
+    output.setflags(write=False)
+
+    return output
+
+
+def untwiddle(data: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Reorder a flat array of twiddled values into an array with the shape
+    (height, width, ...)."""
+
+    return data[twiddle_indices(width, height)]
+
+
+def twiddle(values: np.ndarray) -> np.ndarray:
+    """Reorder an array with the shape (height, width, ...) into a flat
+    array in twiddled order."""
+
+    height, width = values.shape[:2]
+
+    return values.reshape((width * height,) + values.shape[2:])[linear_indices(width, height)]
@@ -0,0 +1,152 @@
+# Vector quantization functions for PVR VQ textures.
+#
+# VQ textures use a codebook of up to 256 2x2 blocks. Each block is treated as a vector of
+# 16 values (4 RGBA pixels), and the codebook is trained on the blocks of a texture with k-means.
+# Training is deterministic for a given seed. The nearest codebook entry search, which takes most
+# of the time, can be split across threads with jobs.
+#
+# QUALITY_PRESETS trade speed for quality:
+#   fast: Trains on a sample of the blocks with few iterations. Use while iterating on edits.
+#   normal: Trains on all blocks.
+#   high: Uses k-means++ initialization and more iterations. Use for release builds.
+# NumPy is required as a dependency.
+
+import math
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+
+class VQSettings(NamedTuple):
+    iterations: int
+    sample_size: int
+    "Maximum number of vectors used for training. 0 to use all vectors."
+    init: str
+    "\"random\" or \"kmeans++\"."
+
+
+QUALITY_PRESETS = {
+    "fast": VQSettings(4, 4096, "random"),
+    "normal": VQSettings(10, 0, "random"),
+    "high": VQSettings(32, 0, "kmeans++"),
+}
+
+# Maximum number of values in each distance matrix.
+_DISTANCE_BLOCK_SIZE = 1 << 22
+
+
+def _nearest_block(vectors: np.ndarray, codebook: np.ndarray, codebook_norms: np.ndarray):
+    step = max(1, _DISTANCE_BLOCK_SIZE // len(codebook))
+    output = np.empty(len(vectors), dtype=np.intp)
+    for start in range(0, len(vectors), step):
+        distances = codebook_norms - 2 * vectors[start : start + step] @ codebook.T
+        output[start : start + step] = distances.argmin(axis=1)
+
+    return output
+
+
+def nearest(vectors: np.ndarray, codebook: np.ndarray, jobs=1) -> np.ndarray:
+    """Return the index of the nearest codebook entry to each vector.
+
+    With jobs greater than 1, the vectors are split between that many
+    threads. NumPy releases the GIL during the matrix products."""
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    codebook = np.asarray(codebook, dtype=np.float32)
+    codebook_norms = (codebook**2).sum(axis=1)
+
+    if jobs <= 1 or len(vectors) < jobs * 1024:
+        return _nearest_block(vectors, codebook, codebook_norms)
+
+    splits = np.array_split(vectors, jobs)
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        results = executor.map(
+            lambda i: _nearest_block(i, codebook, codebook_norms), splits
+        )
+        return np.concatenate(list(results))
+
+
+def _init_kmeans_plus_plus(
+    vectors: np.ndarray, entries: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Choose initial codebook entries, each with probability proportional
+    to its squared distance from the nearest entry chosen so far."""
+
+    codebook = np.empty((entries, vectors.shape[1]), dtype=np.float32)
+    codebook[0] = vectors[rng.integers(len(vectors))]
+    distances = ((vectors - codebook[0]) ** 2).sum(axis=1)
+
+    for i in range(1, entries):
+        total = distances.sum()
+        if total == 0:
+            codebook[i:] = codebook[0]
+            break
+        codebook[i] = vectors[rng.choice(len(vectors), p=distances / total)]
+        distances = np.minimum(distances, ((vectors - codebook[i]) ** 2).sum(axis=1))
+
+    return codebook
+
+
+def train_codebook(
+    vectors: np.ndarray,
+    entries: int,
+    iterations=10,
+    seed=0,
+    jobs=1,
+    sample_size=0,
+    init="random",
+) -> np.ndarray:
+    """Train a codebook of at most entries vectors with k-means.
+
+    If there are no more unique vectors than entries, the unique vectors
+    are returned. sample_size limits the number of vectors used for
+    training, chosen at random. Training stops early when no vector
+    changes its nearest entry.
+
+    Returns a float32 array with the shape (entries or fewer, vector length)."""
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    unique = np.unique(vectors, axis=0)
+    if len(unique) <= entries:
+        return unique
+
+    rng = np.random.default_rng(seed)
+    if sample_size and len(vectors) > sample_size:
+        vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+    if init == "kmeans++":
+        codebook = _init_kmeans_plus_plus(vectors, entries, rng)
+    else:
+        codebook = unique[rng.choice(len(unique), entries, replace=False)]
+
+    assignments = None
+    for _ in range(iterations):
+        new_assignments = nearest(vectors, codebook, jobs)
+        if assignments is not None and (new_assignments == assignments).all():
+            break
+        assignments = new_assignments
+
+        counts = np.bincount(assignments, minlength=entries)
+        sums = np.zeros_like(codebook)
+        np.add.at(sums, assignments, vectors)
+
+        used = counts > 0
+        codebook[used] = sums[used] / counts[used, np.newaxis]
+        # Move unused entries to the vectors with the largest error.
+        if not used.all():
+            errors = ((vectors - codebook[assignments]) ** 2).sum(axis=1)
+            codebook[~used] = vectors[np.argsort(errors)[-(~used).sum() :]]
+
+    return codebook
+
+
+def psnr(original: np.ndarray, decoded: np.ndarray) -> float:
+    """Return the peak signal-to-noise ratio in dB between two arrays of
+    8-bit values. Returns infinity if they are identical."""
+
+    mse = np.mean((original.astype(np.float64) - decoded.astype(np.float64)) ** 2)
+    if mse == 0:
+        return math.inf
+
+    return 10 * math.log10(255**2 / mse)
@@ -0,0 +1,102 @@
+# This script checks the CSV files in the 'translate' subdirectory recursively, as write_ascr.py
+# would encode them, without writing any output files.
+# Line break overflows, characters that cannot be encoded, control codes without a closing }, unknown
+# entry types, and malformed rows are collected from all files in parallel and written as a JSON report. Files that cannot be
+# read or decoded as UTF-8 are reported as issues, and the remaining files are still checked.
+#
+# When run without arguments, all CSV files for SBX, SBN, and ASCR files are checked.
+# Otherwise, CSV files are expected as arguments.
+#
+# The exit status is 1 if any issues are found, so this script can be used as a pre-commit hook.
+
+import argparse
+import csv
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from glob import glob
+
+from utils.ascr import ValidationIssue, validate_strings
+
+path = os.path.realpath(os.path.dirname(sys.argv[0]))
+translate_path = os.path.join(path, "translate")
+
+
+def validate_file(translate_file: str) -> tuple[int, list]:
+    """Check a single CSV file.
+
+    Returns a tuple containing the number of rows checked and a list of
+    issues converted to dicts. A file that cannot be read is reported as a
+    single issue of the kind "file"."""
+
+    try:
+        with open(translate_file, encoding="utf-8") as file:
+            strings = list(csv.reader(file, delimiter="|"))
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        return (0, [ValidationIssue(translate_file, 0, 0, "file", [], str(e))._asdict()])
+
+    issues = validate_strings(strings, filename=translate_file)
+
+    return (len(strings), [issue._asdict() for issue in issues])
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check translated ASCR CSV files for line break overflows and invalid characters."
+    )
+    parser.add_argument("files", nargs="*", help="CSV files to check.")
+    parser.add_argument(
+        "-o", "--output", help="Write the JSON report to this file instead of stdout."
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="Number of worker processes."
+    )
+    args = parser.parse_args()
+
+    if args.files:
+        file_list = [(i + ".csv" if not i.endswith(".csv") else i) for i in args.files]
+    else:
+        file_list = [
+            i
+            for i in glob(f"{translate_path}/**/*.csv", recursive=True)
+            if os.path.splitext(i)[0].casefold().endswith((".sbx", ".sbn", ".ascr"))
+        ]
+
+    strings_checked = 0
+    issues = []
+
+    if len(file_list) > 1 and args.jobs != 1:
+        with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+            results = executor.map(validate_file, file_list, chunksize=8)
+            for rows, file_issues in results:
+                strings_checked += rows
+                issues += file_issues
+    else:
+        for i in file_list:
+            rows, file_issues = validate_file(i)
+            strings_checked += rows
+            issues += file_issues
+
+    report = {
+        "files": len(file_list),
+        "strings": strings_checked,
+        "issues": issues,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            json.dump(report, output_file, ensure_ascii=False, indent=1)
+        print(
+            f"Checked {strings_checked} strings in {len(file_list)} file(s). {len(issues)} issue(s) written to {args.output}."
+        )
+    else:
+        json.dump(report, sys.stdout, ensure_ascii=False, indent=1)
+        print()
+
+    if issues:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()